@@ -3,14 +3,29 @@ from flask_cors import CORS
 from flask_jwt_extended import jwt_required
 import os
 import json
+import hashlib
 import threading
+import mimetypes
+from concurrent.futures import TimeoutError as JobWaitTimeout
+from datetime import datetime
+from functools import partial
+from urllib.parse import quote
 from werkzeug.utils import secure_filename
+from werkzeug.http import http_date
 from werkzeug.datastructures import FileStorage
 from services.pobs_service import verify_new_records, add_new_records, update_imei_data, verify_new_records_realtime, add_new_records_realtime, update_imei_data_realtime
 from services.pcom_service import process_pcom_files, process_pcom_with_pobs, process_pcom_files_realtime, process_pcom_with_pobs_realtime
 from services.tracking_service import generate_upload_gsped, update_tracking_data, generate_upload_gsped_realtime, update_tracking_data_realtime
 from services.logger_service import operation_logger
 from services.realtime_logger import realtime_logger
+from services.workbook_cache import workbook_cache
+from services import excel_io
+from services.job_service import job_manager, JobLimitExceeded
+from services.result_storage import result_storage
+from services.file_index import file_index, page_files, OUTPUT_DIRS, FEATURE_DIRS
+from services.file_response import file_response, stat_etag, content_disposition, check_preconditions
+from services.zip_stream import stream_zip
+from services.preview_service import preview_file as build_preview, read_preview_sidecar, remove_preview_sidecar, sidecar_path
 from middleware.auth import init_auth, login
 
 app = Flask(__name__)
@@ -22,7 +37,9 @@ CORS(app, origins=[
     "http://tauri.localhost",
     "http://127.0.0.1:3000"
 ], supports_credentials=True, methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-   allow_headers=['Content-Type', 'Authorization', 'X-Requested-With', 'Accept-Ranges', 'Range'])
+   allow_headers=['Content-Type', 'Authorization', 'X-Requested-With', 'Accept-Ranges', 'Range',
+                  'If-Range', 'If-None-Match', 'If-Modified-Since', 'If-Match', 'Prefer', 'Last-Event-ID'],
+   expose_headers=['ETag', 'Last-Modified', 'Content-Range', 'Content-Disposition', 'Accept-Ranges'])
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
 
 # Initialize JWT authentication
@@ -44,14 +61,91 @@ os.makedirs('uploads', exist_ok=True)
 os.makedirs('outputs', exist_ok=True)
 
 def save_uploaded_file(file: FileStorage, folder: str) -> str:
-    """Save uploaded file and return the path"""
+    """Save uploaded file and return the path
+
+    The SHA-256 of the upload is computed while writing so repeat uploads of
+    identical bytes are served from the parsed-input cache without re-hashing.
+    The file is written aside and renamed over any previous upload: when
+    WORKBOOK_COPY_METHODS allows hardlinks, that one may be linked to an
+    output by save_workbook and must not be truncated.
+    """
     if file and file.filename:
         filename = secure_filename(file.filename)
         filepath = os.path.join(folder, filename)
-        file.save(filepath)
+        tmp_path = os.path.join(folder, f".{filename}.{os.getpid()}.{threading.get_ident()}.upload")
+        sha = hashlib.sha256()
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = file.stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                out.write(chunk)
+        os.replace(tmp_path, filepath)
+        workbook_cache.register_digest(filepath, sha.hexdigest())
         return filepath
     return None
 
+# Longest wait a client can ask for before getting 202 with the job id, kept
+# well below the gunicorn worker timeout
+JOB_MAX_WAIT_SECONDS = float(os.getenv('JOB_MAX_WAIT_SECONDS', '20'))
+
+def job_wait_seconds() -> float:
+    """
+    Seconds to wait for the result before answering with the job id
+
+    0 unless the client opts in with ?wait=N or Prefer: wait=N, capped at
+    JOB_MAX_WAIT_SECONDS; Prefer: respond-async always answers at once.
+    """
+    requested = request.args.get('wait')
+    for preference in request.headers.get('Prefer', '').split(','):
+        name, _, value = preference.strip().partition('=')
+        if name.strip().lower() == 'respond-async':
+            return 0
+        if name.strip().lower() == 'wait':
+            requested = value.strip()
+    try:
+        return min(JOB_MAX_WAIT_SECONDS, max(0.0, float(requested))) if requested else 0
+    except ValueError:
+        return 0
+
+def run_operation(operation: str, func, *args, realtime=None):
+    """
+    Run a service call on the job pool
+
+    Answers 202 with the job id to poll (/api/jobs/<id>) right away, or the
+    result when the client opted into waiting (job_wait_seconds) and the
+    job finished in time. 429 when the operation type is saturated.
+
+    When the form carries a session_id, the realtime variant of the call
+    (realtime: function followed by its arguments, called with session_id)
+    runs instead, so the session's SSE stream follows the job as it runs.
+    """
+    session_id = request.form.get('session_id')
+    live = bool(session_id and realtime)
+    if live:
+        func, args = realtime[0], realtime[1:]
+    try:
+        job = job_manager.submit(operation, func, *args, session_id=session_id, live=live)
+    except JobLimitExceeded as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+
+    wait = job_wait_seconds()
+    if wait > 0:
+        try:
+            return jsonify(job.wait(wait))
+        except JobWaitTimeout:
+            pass
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/api/jobs/{job.id}',
+        'result_url': f'/api/jobs/{job.id}/result'
+    }), 202
+
 # ============================================================================
 # Authentication Routes
 # ============================================================================
@@ -80,9 +174,9 @@ def pobs_verify_new():
         noleggio_path = save_uploaded_file(noleggio_file, 'uploads')
         pobs_path = save_uploaded_file(pobs_file, 'uploads')
 
-        # Process files and return complete result with logs
-        result = verify_new_records(noleggio_path, pobs_path)
-        return jsonify(result)
+        # Process files on the job pool (returns the job id to poll)
+        return run_operation('pobs', verify_new_records, noleggio_path, pobs_path,
+                             realtime=(verify_new_records_realtime, noleggio_path, pobs_path))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -102,9 +196,9 @@ def pobs_add_new():
         noleggio_path = save_uploaded_file(noleggio_file, 'uploads')
         pobs_path = save_uploaded_file(pobs_file, 'uploads')
 
-        # Process files and return complete result with logs
-        result = add_new_records(noleggio_path, pobs_path, 'outputs')
-        return jsonify(result)
+        # Process files on the job pool (returns the job id to poll)
+        return run_operation('pobs', add_new_records, noleggio_path, pobs_path, 'outputs',
+                             realtime=(add_new_records_realtime, noleggio_path, pobs_path))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -127,9 +221,9 @@ def pobs_update_imei():
         master_path = save_uploaded_file(master_file, 'uploads')
         template_path = save_uploaded_file(template_file, 'uploads')
 
-        # Process files and return complete result with logs
-        result = update_imei_data(pobs_path, master_path, template_path, 'outputs', custom_name)
-        return jsonify(result)
+        # Process files on the job pool (returns the job id to poll)
+        return run_operation('pobs', update_imei_data, pobs_path, master_path, template_path, 'outputs', custom_name,
+                             realtime=(partial(update_imei_data_realtime, custom_name=custom_name), pobs_path, master_path, template_path))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -163,14 +257,13 @@ def pcom_process():
         modelli_path = save_uploaded_file(modelli_file, 'uploads') if modelli_file else None
         pobs_path = save_uploaded_file(pobs_file, 'uploads') if pobs_file else None
 
-        # Process files and return complete result
+        # Process files on the job pool (returns the job id to poll)
         if pobs_path:
-            result = process_pcom_with_pobs(noleggio_path, soho_path, pobs_path, 'outputs', modelli_path, options, custom_names)
-        else:
-            result = process_pcom_files(noleggio_path, soho_path, 'outputs', modelli_path, options, custom_names.get('pcom') if custom_names else None)
-
-
-        return jsonify(result)
+            return run_operation('pcom', process_pcom_with_pobs, noleggio_path, soho_path, pobs_path, 'outputs', modelli_path, options, custom_names,
+                                 realtime=(process_pcom_with_pobs_realtime, noleggio_path, soho_path, pobs_path, 'outputs', modelli_path, options, custom_names))
+        custom_name = custom_names.get('pcom') if custom_names else None
+        return run_operation('pcom', process_pcom_files, noleggio_path, soho_path, 'outputs', modelli_path, options, custom_name,
+                             realtime=(process_pcom_files_realtime, noleggio_path, soho_path, 'outputs', modelli_path, options, custom_name))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -194,9 +287,9 @@ def tracking_generate_gsped():
         pobs_path = save_uploaded_file(pobs_file, 'uploads')
         masterfile_path = save_uploaded_file(masterfile_file, 'uploads')
 
-        # Process files and return complete result
-        result = generate_upload_gsped(pobs_path, masterfile_path, 'outputs')
-        return jsonify(result)
+        # Process files on the job pool (returns the job id to poll)
+        return run_operation('tracking', generate_upload_gsped, pobs_path, masterfile_path, 'outputs',
+                             realtime=(generate_upload_gsped_realtime, pobs_path, masterfile_path, 'outputs'))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -219,9 +312,9 @@ def tracking_update():
         trasporti_path = save_uploaded_file(trasporti_file, 'uploads')
         masterfile_path = save_uploaded_file(masterfile_file, 'uploads') if masterfile_file else None
 
-        # Process files and return complete result
-        result = update_tracking_data(pobs_path, trasporti_path, masterfile_path, 'outputs', custom_name)
-        return jsonify(result)
+        # Process files on the job pool (returns the job id to poll)
+        return run_operation('tracking', update_tracking_data, pobs_path, trasporti_path, masterfile_path, 'outputs', custom_name,
+                             realtime=(update_tracking_data_realtime, pobs_path, trasporti_path, masterfile_path, 'outputs', custom_name))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -239,10 +332,47 @@ def generate_file_chunks(file_path, chunk_size=8192):
                 break
             yield chunk
 
+# Internal nginx location mapped onto outputs/ (e.g. /protected-outputs/);
+# when set, nginx sends the file bytes and the worker only authorizes
+X_ACCEL_REDIRECT_PREFIX = os.getenv('X_ACCEL_REDIRECT_PREFIX', '')
+
+def send_output_file(file_path, filename):
+    """
+    Send an output file without copying it through the worker
+
+    Responses carry an ETag and Last-Modified, and revalidations are
+    answered with 304 before any byte is sent. With X_ACCEL_REDIRECT_PREFIX
+    the response is an empty X-Accel-Redirect to nginx (which also handles
+    ranges) and the ETag comes from size and mtime, so the worker never
+    reads the file. Otherwise file_response serves ranges with a content
+    hash ETag and hands full files to wsgi.file_wrapper (sendfile under
+    gunicorn).
+    """
+    file_path = os.path.abspath(file_path)
+    if not X_ACCEL_REDIRECT_PREFIX:
+        return file_response(file_path, filename, request.environ)
+
+    stat = os.stat(file_path)
+    etag = stat_etag(stat)
+    mtime = stat.st_mtime
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(mtime),
+        'Cache-Control': 'no-cache',
+        'Content-Disposition': content_disposition(filename)
+    }
+    status = check_preconditions(request.environ, etag, mtime)
+    if status is not None:
+        return Response(status=status, headers=headers)
+
+    relative_path = os.path.relpath(file_path, os.path.abspath(file_index.root))
+    headers['X-Accel-Redirect'] = X_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(relative_path.replace(os.sep, '/'))
+    return Response(headers=headers, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+
 @app.route('/api/download/<filename>')
 @jwt_required(optional=True)
 def download_file(filename):
-    """Download generated files with enhanced subdirectory search and streaming for large files"""
+    """Download generated files with enhanced subdirectory search, served by nginx or sendfile"""
     try:
         # Check authentication - either JWT header or token query param
         from flask_jwt_extended import get_jwt_identity, decode_token
@@ -258,69 +388,14 @@ def download_file(filename):
                     return jsonify({'error': 'Invalid token'}), 401
             else:
                 return jsonify({'error': 'Authentication required'}), 401
-        # Define priority search order for subdirectories
-        search_dirs = [
-            'outputs',  # Direct outputs folder
-            'outputs/PCOM',  # PCOM files
-            'outputs/POBS',  # POBS files
-            'outputs/IMEI HUB',  # IMEI HUB files
-            'outputs/GSPED',  # GSPED files
-            'outputs/TRACKING RADAR',  # Tracking radar files
-            'outputs/POBS CON TRACKING',  # POBS with tracking
-            'outputs/Backup',  # Backup files
-            'outputs/backup_POBS'  # POBS backup files
-        ]
-
-        file_path = None
-
-        # First try priority directories
-        for search_dir in search_dirs:
-            potential_path = os.path.join(search_dir, filename)
-            if os.path.exists(potential_path):
-                file_path = potential_path
-                break
-
-        # If not found, do a comprehensive search in all subdirectories
-        if not file_path:
-            for root, dirs, files in os.walk('outputs'):
-                if filename in files:
-                    file_path = os.path.join(root, filename)
-                    break
+        # Output folders first (in priority order), then any other subdirectory
+        file_path = file_index.lookup(filename)
 
         if not file_path:
             return jsonify({'error': f'File "{filename}" not found in any output directory'}), 404
 
-        # Check file size for optimization
-        file_size = os.path.getsize(file_path)
-
-        # For very large files (>10MB), use chunked streaming
-        if file_size > 10 * 1024 * 1024:  # 10MB
-            def generate():
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(8192)  # 8KB chunks
-                        if not chunk:
-                            break
-                        yield chunk
-
-            response = Response(
-                generate(),
-                headers={
-                    'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    'Content-Disposition': f'attachment; filename="{filename}"',
-                    'Content-Length': str(file_size),
-                    'Cache-Control': 'no-cache',
-                    'Connection': 'keep-alive'
-                }
-            )
-            return response
-        else:
-            # For smaller files, use send_file
-            return send_file(
-                file_path,
-                as_attachment=True,
-                download_name=filename
-            )
+        # Large and small files alike go out via nginx or sendfile
+        return send_output_file(file_path, filename)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -331,93 +406,13 @@ def download_file_direct(filename):
     """Alternative direct download with range request support for large files"""
     try:
         # Same file search logic
-        search_dirs = [
-            'outputs', 'outputs/PCOM', 'outputs/POBS', 'outputs/IMEI HUB',
-            'outputs/GSPED', 'outputs/TRACKING RADAR', 'outputs/POBS CON TRACKING',
-            'outputs/Backup', 'outputs/backup_POBS'
-        ]
-
-        file_path = None
-        for search_dir in search_dirs:
-            potential_path = os.path.join(search_dir, filename)
-            if os.path.exists(potential_path):
-                file_path = potential_path
-                break
-
-        if not file_path:
-            for root, dirs, files in os.walk('outputs'):
-                if filename in files:
-                    file_path = os.path.join(root, filename)
-                    break
+        file_path = file_index.lookup(filename)
 
         if not file_path:
             return jsonify({'error': f'File "{filename}" not found'}), 404
 
-        # Get file size
-        file_size = os.path.getsize(file_path)
-
-        # Check if client supports range requests
-        range_header = request.headers.get('Range')
-
-        if range_header:
-            # Parse range header
-            byte_start = 0
-            byte_end = file_size - 1
-
-            if range_header.startswith('bytes='):
-                range_match = range_header[6:].split('-')
-                if range_match[0]:
-                    byte_start = int(range_match[0])
-                if range_match[1]:
-                    byte_end = int(range_match[1])
-
-            content_length = byte_end - byte_start + 1
-
-            def generate_partial():
-                with open(file_path, 'rb') as f:
-                    f.seek(byte_start)
-                    remaining = content_length
-                    while remaining:
-                        chunk_size = min(8192, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-
-            response = Response(
-                generate_partial(),
-                206,  # Partial Content
-                headers={
-                    'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    'Content-Range': f'bytes {byte_start}-{byte_end}/{file_size}',
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': str(content_length),
-                    'Content-Disposition': f'attachment; filename="{filename}"',
-                }
-            )
-            return response
-        else:
-            # No range request, send entire file with chunked encoding
-            def generate_full():
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(8192)
-                        if not chunk:
-                            break
-                        yield chunk
-
-            response = Response(
-                generate_full(),
-                headers={
-                    'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    'Content-Length': str(file_size),
-                    'Content-Disposition': f'attachment; filename="{filename}"',
-                    'Accept-Ranges': 'bytes',
-                    'Cache-Control': 'no-cache'
-                }
-            )
-            return response
+        # Range, If-Range and conditional requests are answered by nginx or file_response
+        return send_output_file(file_path, filename)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -439,30 +434,76 @@ def download_file_simple(filename):
             return jsonify({'error': 'Invalid token'}), 401
 
         # Same file search logic
-        search_dirs = [
-            'outputs', 'outputs/PCOM', 'outputs/POBS', 'outputs/IMEI HUB',
-            'outputs/GSPED', 'outputs/TRACKING RADAR', 'outputs/POBS CON TRACKING',
-            'outputs/Backup', 'outputs/backup_POBS'
-        ]
-
-        file_path = None
-        for search_dir in search_dirs:
-            potential_path = os.path.join(search_dir, filename)
-            if os.path.exists(potential_path):
-                file_path = potential_path
-                break
-
-        if not file_path:
-            for root, dirs, files in os.walk('outputs'):
-                if filename in files:
-                    file_path = os.path.join(root, filename)
-                    break
+        file_path = file_index.lookup(filename)
 
         if not file_path:
             return jsonify({'error': f'File "{filename}" not found'}), 404
 
         # Simple direct file send
-        return send_file(file_path, as_attachment=True, download_name=filename)
+        return send_output_file(file_path, filename)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def result_download_files(result):
+    """File names offered for download by an operation result"""
+    if not result:
+        return []
+    names = list(result.get('download_files') or [])
+    if result.get('download_file'):
+        names.insert(0, result['download_file'])
+    return list(dict.fromkeys(name for name in names if name))
+
+@app.route('/api/download/bundle')
+@jwt_required(optional=True)
+def download_bundle():
+    """
+    Stream a ZIP of several output files in one response
+
+    The files are those of a job result (job_id), of a real-time session
+    result (session_id) or an explicit comma-separated list (files).
+    """
+    try:
+        from flask_jwt_extended import get_jwt_identity, decode_token
+
+        # Same authentication as /api/download: JWT header or token query param
+        if not get_jwt_identity():
+            token = request.args.get('token')
+            if not token:
+                return jsonify({'error': 'Authentication required'}), 401
+            try:
+                decode_token(token)
+            except Exception:
+                return jsonify({'error': 'Invalid token'}), 401
+
+        if request.args.get('job_id'):
+            names = result_download_files(job_manager.result(request.args['job_id']))
+        elif request.args.get('session_id'):
+            names = result_download_files(realtime_logger.get_result(request.args['session_id']))
+        else:
+            names = list(dict.fromkeys(name.strip() for name in request.args.get('files', '').split(',') if name.strip()))
+
+        if not names:
+            return jsonify({'error': 'No files to bundle'}), 404
+
+        files = [(file_index.lookup(name), name) for name in names]
+        missing = [name for path, name in files if not path]
+        if missing:
+            return jsonify({'error': f'Files not found: {", ".join(missing)}'}), 404
+
+        bundle_name = secure_filename(request.args.get('name', '')) or f"easyrent_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if not bundle_name.lower().endswith('.zip'):
+            bundle_name += '.zip'
+
+        return Response(
+            stream_zip(files),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': content_disposition(bundle_name),
+                'Cache-Control': 'no-cache'
+            },
+            direct_passthrough=True
+        )
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -471,51 +512,124 @@ def download_file_simple(filename):
 # Historic Files Management
 # ============================================================================
 
+HISTORIC_QUERY_PARAMS = ('feature', 'ext', 'modified_after', 'modified_before', 'sort', 'order', 'cursor', 'limit')
+
+def parse_timestamp(value):
+    """Epoch seconds or ISO date/datetime from a query parameter"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def historic_file_entry(info, feature=None, with_preview=False):
+    """JSON view of an indexed output file, with the header and row count of its preview sidecar if asked"""
+    entry = {
+        'name': info.name,
+        'path': info.directory,
+        'size': info.size,
+        'created': info.created,
+        'modified': info.modified,
+        'extension': os.path.splitext(info.name)[1],
+        'download_url': f'/api/download/{info.name}',
+        'preview_url': f'/api/historic/preview/{info.name}' if info.name.lower().endswith(('.xlsx', '.xls', '.csv')) else None
+    }
+    if feature:
+        entry['feature'] = feature
+    if with_preview and entry['preview_url']:
+        # Only read from a fresh sidecar: a listing never opens the workbooks
+        sidecar = read_preview_sidecar(os.path.join(info.directory, info.name), with_rows=False)
+        entry['columns'] = sidecar['columns'] if sidecar else None
+        entry['total_rows'] = sidecar['total_rows'] if sidecar else None
+    return entry
+
+def sidecar_state(info) -> str:
+    """Stat of an output file's preview sidecar, without reading it ('-' when there is none)"""
+    try:
+        stat = os.stat(sidecar_path(os.path.join(info.directory, info.name)))
+    except OSError:
+        return '-'
+    return f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+
 @app.route('/api/historic/files')
 @jwt_required()
 def get_historic_files():
-    """Get all historic files organized by feature type"""
+    """
+    Get historic files organized by feature type
+
+    Without query parameters returns every file grouped by feature. With any
+    of feature, ext, modified_after, modified_before, sort (modified, created,
+    size, name), order (asc, desc), cursor or limit returns one page of a
+    flat listing plus the cursor of the next page; paged entries carry the
+    columns and row count of their preview sidecar (null until one exists).
+    Both answer 304 when the If-None-Match ETag still matches the listing;
+    for pages the ETag also covers the sidecars of the files on the page.
+    """
     try:
-        # Define folder mappings
-        folder_mappings = {
-            'POBS': ['outputs/POBS', 'outputs/backup_POBS'],
-            'PCOM': ['outputs/PCOM'],
-            'IMEI_HUB': ['outputs/IMEI HUB'],
-            'GSPED': ['outputs/GSPED'],
-            'TRACKING_RADAR': ['outputs/TRACKING RADAR'],
-            'POBS_TRACKING': ['outputs/POBS CON TRACKING'],
-            'BACKUP': ['outputs/Backup']
-        }
-
-        result = {}
-
-        for feature, folders in folder_mappings.items():
-            files = []
-            for folder in folders:
-                if os.path.exists(folder):
-                    for filename in os.listdir(folder):
-                        file_path = os.path.join(folder, filename)
-                        if os.path.isfile(file_path):
-                            stat = os.stat(file_path)
-                            files.append({
-                                'name': filename,
-                                'path': folder,
-                                'size': stat.st_size,
-                                'created': stat.st_ctime,
-                                'modified': stat.st_mtime,
-                                'extension': os.path.splitext(filename)[1],
-                                'download_url': f'/api/download/{filename}',
-                                'preview_url': f'/api/historic/preview/{filename}' if filename.lower().endswith(('.xlsx', '.xls', '.csv')) else None
-                            })
-
-            # Sort by modification time (newest first)
-            files.sort(key=lambda x: x['modified'], reverse=True)
-            result[feature] = files
+        args = request.args
+        paginated = any(name in args for name in HISTORIC_QUERY_PARAMS)
+
+        features = FEATURE_DIRS
+        if args.get('feature'):
+            requested = [name.strip().upper() for name in args['feature'].split(',') if name.strip()]
+            unknown = [name for name in requested if name not in FEATURE_DIRS]
+            if unknown:
+                return jsonify({'error': f'Unknown feature: {", ".join(unknown)}'}), 400
+            features = {name: FEATURE_DIRS[name] for name in requested}
+
+        dir_features = {folder: feature for feature, folders in features.items() for folder in folders}
+        files, version = file_index.snapshot(dir_features)
+
+        page = None
+        if paginated:
+            if args.get('ext'):
+                extensions = {('.' + ext.strip().lstrip('.')).lower() for ext in args['ext'].split(',') if ext.strip()}
+                files = [info for info in files if os.path.splitext(info.name)[1].lower() in extensions]
+            limit = max(1, min(args.get('limit', 100, type=int), 1000))
+            order = args.get('order', 'desc').lower()
+            if order not in ('asc', 'desc'):
+                return jsonify({'error': "order must be 'asc' or 'desc'"}), 400
+            try:
+                if args.get('modified_after'):
+                    after = parse_timestamp(args['modified_after'])
+                    files = [info for info in files if info.modified >= after]
+                if args.get('modified_before'):
+                    before = parse_timestamp(args['modified_before'])
+                    files = [info for info in files if info.modified < before]
+                page, next_cursor = page_files(files, sort=args.get('sort', 'modified'),
+                                               descending=order == 'desc',
+                                               cursor=args.get('cursor'), limit=limit)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        # The listing only changes with the files, the query and, for a page,
+        # the sidecars its entries report columns and row counts from
+        query = '&'.join(f'{name}={args[name]}' for name in HISTORIC_QUERY_PARAMS if name in args)
+        sidecars = ','.join(sidecar_state(info) for info in page) if page is not None else ''
+        etag = hashlib.sha1(f'{version}?{query}#{sidecars}'.encode('utf-8')).hexdigest()
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
 
-        return jsonify({
-            'success': True,
-            'data': result
-        })
+        if not paginated:
+            result = {feature: [] for feature in features}
+            for info in sorted(files, key=lambda f: f.modified, reverse=True):
+                result[dir_features[info.directory]].append(historic_file_entry(info))
+            response = jsonify({
+                'success': True,
+                'data': result
+            })
+        else:
+            response = jsonify({
+                'success': True,
+                'files': [historic_file_entry(info, dir_features[info.directory], with_preview=True) for info in page],
+                'total': len(files),
+                'next_cursor': next_cursor
+            })
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -523,71 +637,34 @@ def get_historic_files():
 @app.route('/api/historic/preview/<filename>')
 @jwt_required()
 def preview_file(filename):
-    """Preview file content (supports both small preview and expanded view)"""
+    """Preview file content: a window of rows (offset, limit) and optionally a subset of columns"""
     try:
         # Search for file in all output directories
-        search_dirs = [
-            'outputs/PCOM', 'outputs/POBS', 'outputs/IMEI HUB',
-            'outputs/GSPED', 'outputs/TRACKING RADAR',
-            'outputs/POBS CON TRACKING', 'outputs/Backup', 'outputs/backup_POBS'
-        ]
-
-        file_path = None
-        for search_dir in search_dirs:
-            potential_path = os.path.join(search_dir, filename)
-            if os.path.exists(potential_path):
-                file_path = potential_path
-                break
+        file_path = file_index.lookup(filename, OUTPUT_DIRS)
 
         if not file_path:
             return jsonify({'error': f'File "{filename}" not found'}), 404
 
-        # Check file extension
-        ext = os.path.splitext(filename)[1].lower()
-
-        # Get limit from query parameter (default 10 for small preview, more for expanded)
-        limit = request.args.get('limit', '10', type=int)
-        limit = min(limit, 1000)  # Cap at 1000 rows for performance
-
-        if ext in ['.xlsx', '.xls']:
-            import pandas as pd
-            df = pd.read_excel(file_path, dtype=str)
-            preview_data = df.head(limit).fillna('').to_dict('records')
-            columns = list(df.columns)
-
-            return jsonify({
-                'success': True,
-                'data': {
-                    'columns': columns,
-                    'rows': preview_data,
-                    'total_rows': len(df),
-                    'filename': filename,
-                    'type': 'excel',
-                    'preview_limit': limit
-                }
-            })
+        # Only the requested window (and columns) is decoded
+        limit = request.args.get('limit', 10, type=int)
+        offset = request.args.get('offset', 0, type=int)
+        columns = [name.strip() for name in request.args.get('columns', '').split(',') if name.strip()] or None
 
-        elif ext == '.csv':
-            import pandas as pd
-            df = pd.read_csv(file_path, dtype=str)
-            preview_data = df.head(limit).fillna('').to_dict('records')
-            columns = list(df.columns)
-
-            return jsonify({
-                'success': True,
-                'data': {
-                    'columns': columns,
-                    'rows': preview_data,
-                    'total_rows': len(df),
-                    'filename': filename,
-                    'type': 'csv',
-                    'preview_limit': limit
-                }
-            })
-
-        else:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in ['.xlsx', '.xls', '.csv']:
             return jsonify({'error': 'File type not supported for preview'}), 400
 
+        preview = build_preview(file_path, offset=offset, limit=limit, columns=columns)
+        preview.update({
+            'filename': filename,
+            'type': 'csv' if ext == '.csv' else 'excel',
+            'preview_limit': preview['limit']
+        })
+        return jsonify({
+            'success': True,
+            'data': preview
+        })
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -597,23 +674,14 @@ def delete_historic_file(filename):
     """Delete a historic file"""
     try:
         # Search for file in all output directories
-        search_dirs = [
-            'outputs/PCOM', 'outputs/POBS', 'outputs/IMEI HUB',
-            'outputs/GSPED', 'outputs/TRACKING RADAR',
-            'outputs/POBS CON TRACKING', 'outputs/Backup', 'outputs/backup_POBS'
-        ]
-
-        file_path = None
-        for search_dir in search_dirs:
-            potential_path = os.path.join(search_dir, filename)
-            if os.path.exists(potential_path):
-                file_path = potential_path
-                break
+        file_path = file_index.lookup(filename, OUTPUT_DIRS)
 
         if not file_path:
             return jsonify({'error': f'File "{filename}" not found'}), 404
 
         os.remove(file_path)
+        file_index.discard(file_path)
+        remove_preview_sidecar(file_path)
         return jsonify({
             'success': True,
             'message': f'File "{filename}" deleted successfully'
@@ -622,6 +690,48 @@ def delete_historic_file(filename):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ============================================================================
+# Job Routes
+# ============================================================================
+
+@app.route('/api/jobs/<job_id>')
+@jwt_required()
+def get_job_status(job_id):
+    """Get the status of a background job"""
+    try:
+        state = job_manager.get(job_id)
+        if state is None:
+            return jsonify({'error': 'Job not found'}), 404
+        state.pop('result', None)
+        return jsonify({'success': True, 'job': state})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>/result')
+@jwt_required()
+def get_job_result(job_id):
+    """Get the result of a finished job (202 while it is still running)"""
+    try:
+        state = job_manager.get(job_id)
+        if state is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if state['status'] == 'failed':
+            return jsonify({'error': state['error'], 'job_id': job_id}), 500
+        if state['status'] != 'completed':
+            return jsonify({'success': True, 'job_id': job_id, 'status': state['status']}), 202
+        return jsonify(state['result'])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/stats')
+@jwt_required()
+def get_job_stats():
+    """Get job counts of this worker by operation and status"""
+    try:
+        return jsonify({'success': True, 'jobs': job_manager.stats()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ============================================================================
 # Health Check
 # ============================================================================
@@ -701,7 +811,10 @@ def create_log_session():
 def stream_logs(session_id):
     """Stream logs for a specific session via Server-Sent Events"""
     try:
-        return realtime_logger.get_sse_response(session_id)
+        # Browsers send Last-Event-ID on reconnect; clients that open a new
+        # EventSource can pass it as a query parameter instead
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        return realtime_logger.get_sse_response(session_id, last_event_id)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -766,6 +879,21 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'service': 'EasyRent Backend'})
 
+@app.route('/api/cache/stats')
+@jwt_required()
+def get_cache_stats():
+    """Get hit/miss counters of the parsed-input cache and the result stores"""
+    try:
+        return jsonify({
+            'success': True,
+            'parse_cache': workbook_cache.stats(),
+            'result_store': result_storage.stats(),
+            'session_results': realtime_logger.bus.result_stats(),
+            'file_index': file_index.stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/debug/file-columns', methods=['POST'])
 @jwt_required()
 def debug_file_columns():
@@ -781,8 +909,7 @@ def debug_file_columns():
             file.save(tmp.name)
 
             # Read file and get columns
-            import pandas as pd
-            df = pd.read_excel(tmp.name, dtype=str)
+            df = excel_io.read_excel(tmp.name, dtype=str)
 
             # Clean up
             os.unlink(tmp.name)
@@ -0,0 +1,86 @@
+"""
+Excel reader benchmark
+Times the reader engines on a generated POBS-like workbook
+
+Usage: python benchmarks/bench_excel_readers.py [rows ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import excel_io  # noqa: E402
+from services.pobs_service import NOLEGGIO_COLUMNS, POBS_KEY_COLUMNS  # noqa: E402
+
+# Column declarations of the POBS operations, by width
+PROJECTIONS = {'noleggio': NOLEGGIO_COLUMNS, 'key': POBS_KEY_COLUMNS}
+
+HEADERS = ["POBS ID", "Cliente", "Referente", "Telefono", "Email", "Indirizzo", "CAP", "Città",
+           "Modello", "IMEI", "Data richiesta", "Note", "Tipo", "Durata", "Canone", "Seriale",
+           "Operatore", "Canale", "Agente", "Codice", "Provincia", "Regione", "Priorità", "Esito",
+           "STATO"]
+
+
+def build_workbook(path, rows):
+    """Write a POBS export with realistic types (strings, numbers, dates)"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(HEADERS)
+    start = datetime(2024, 1, 1)
+    for i in range(rows):
+        ws.append([f"POBS-{i:07d}", f"Cliente {i % 997}", f"Referente {i % 113}", f"+39 3{i:09d}",
+                   f"user{i}@example.com", f"Via Roma {i % 300}", f"{i % 100000:05d}", "Milano",
+                   f"MOD-{i % 40}", 350000000000000 + i, start + timedelta(days=i % 365), "",
+                   "Nuovo", 24, 19.9 + (i % 10), f"SN{i:08d}", "OP", "WEB", f"AG{i % 50}",
+                   i, "MI", "Lombardia", i % 3, "OK", "Aperto"])
+    wb.save(path)
+
+
+def timed(func, repeat=3):
+    """Best wall time of a few runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pobs.xlsx")
+        build_workbook(path, rows)
+
+        engines = ['openpyxl'] + (['calamine'] if excel_io.calamine_available() else [])
+        results = {}
+        for engine in engines:
+            excel_io.READER_ENGINE = engine
+            full = excel_io.read_frame(path, dtype=str)
+            results[(engine, 'full')] = (timed(lambda: excel_io.read_frame(path, dtype=str)),
+                                         excel_io.reader_engine(full))
+            for mode, columns in PROJECTIONS.items():
+                projected = excel_io.read_frame(path, columns=columns, dtype=str)
+                # Projected reads must match the same columns sliced out of a full read
+                expected = full.iloc[:len(projected), excel_io.source_positions(projected)]
+                assert projected.equals(expected), f"{engine} {mode}: projected read differs from the full read"
+                results[(engine, mode)] = (timed(lambda: excel_io.read_frame(path, columns=columns, dtype=str)),
+                                           excel_io.reader_engine(projected))
+
+        baseline = results[('openpyxl', 'full')][0]
+        print(f"\n{rows} rows x {len(HEADERS)} columns")
+        for (engine, mode), (elapsed, served_by) in results.items():
+            print(f"  {engine:<10} {mode:<10} {elapsed:8.3f}s  x{baseline / elapsed:5.1f}  ({served_by})")
+        if len(engines) == 1:
+            print("  python-calamine not installed, only openpyxl measured")
+
+
+if __name__ == '__main__':
+    for rows in [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000]:
+        run(rows)
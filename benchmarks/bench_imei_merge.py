@@ -0,0 +1,114 @@
+"""
+IMEI merge benchmark
+Checks merge_imei_rows against the former row-by-row loop on edge cases,
+then times both
+
+Usage: python benchmarks/bench_imei_merge.py [rows ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.pobs_service import merge_imei_rows  # noqa: E402
+
+# The row-by-row loop is only timed up to this size
+LEGACY_MAX_ROWS = 10000
+
+
+def build_frames(rows):
+    """POBS, master and template frames shaped like the real exports"""
+    imeis = [str(350000000000000 + i) for i in range(rows)]
+    df_pobs = pd.DataFrame({'POBS ID': [f"POBS-{i}" for i in range(rows)], 'IMEI': imeis[::-1]})
+    df_master = pd.DataFrame({
+        'GUID': [f"G{i}" for i in range(rows)],
+        'IMEI': imeis,
+        'Modello': [f"MOD-{i % 40}" if i % 17 else '' for i in range(rows)],
+        'Data spedizione': [f"2024-01-{i % 28 + 1:02d}" for i in range(rows)],
+        'Magazzino': ['MI'] * rows,
+    })
+    df_template = pd.DataFrame({col: pd.Series(dtype=object) for col in ['GUID', 'IMEI', 'Modello', 'Data spedizione', 'Note']})
+    return df_pobs, df_master, df_template
+
+
+def legacy_merge(df_pobs, pobs_imei_col, df_master, master_imei_col, df_template):
+    """The loop merge_imei_rows replaced"""
+    df_result = df_template.copy()
+    master_mapping = dict(zip(df_master[master_imei_col].astype(str), df_master.index))
+    updated_count = 0
+    empty_cell_count = 0
+    for _, row in df_pobs.iterrows():
+        imei_value = str(row[pobs_imei_col])
+        if imei_value in master_mapping:
+            master_idx = master_mapping[imei_value]
+            for col in df_master.columns:
+                if col in df_result.columns:
+                    value = df_master.loc[master_idx, col]
+                    df_result.loc[updated_count, col] = value
+                    if value is None or value == '' or (isinstance(value, str) and value.strip() == ''):
+                        empty_cell_count += 1
+            updated_count += 1
+    return df_result, updated_count, empty_cell_count
+
+
+def edge_cases():
+    """Missing, blank and duplicate IMEIs, as strings and as numbers, into empty and filled templates"""
+    string_pobs = ['1', np.nan, '', '2', '1', None, '9']
+    string_master = ['1', np.nan, '', '2', '2', None]
+    number_pobs = [1.0, np.nan, 2.0, np.nan, 1.0]
+    number_master = [1.0, np.nan, 2.0, 3.0]
+    for pobs_keys, master_keys in ((string_pobs, string_master), (number_pobs, number_master)):
+        df_pobs = pd.DataFrame({'POBS ID': [f"POBS-{i}" for i in range(len(pobs_keys))], 'IMEI': pobs_keys})
+        df_master = pd.DataFrame({
+            'IMEI': master_keys,
+            'Modello': [['MOD', '', ' ', None][i % 4] for i in range(len(master_keys))],
+            'Canone': [19.9 + i for i in range(len(master_keys))],
+            'Magazzino': ['MI'] * len(master_keys),
+        })
+        for template_rows in (0, 2, 10):
+            df_template = pd.DataFrame({col: ['T'] * template_rows for col in ['IMEI', 'Modello', 'Canone', 'Note']},
+                                       dtype=object)
+            yield df_pobs, df_master, df_template
+
+
+def check():
+    """Same counts, rows and dtypes as the row-by-row loop"""
+    cases = 0
+    for frames in edge_cases():
+        legacy = legacy_merge(frames[0], 'IMEI', frames[1], 'IMEI', frames[2])
+        merged = merge_imei_rows(frames[0], 'IMEI', frames[1], 'IMEI', frames[2])
+        assert legacy[1:] == merged[1:], f"match counts differ: {legacy[1:]} != {merged[1:]}"
+        pd.testing.assert_frame_equal(legacy[0], merged[0])
+        cases += 1
+    print(f"{cases} edge cases match the row-by-row loop")
+
+
+def run(rows):
+    frames = build_frames(rows)
+    print(f"\n{rows} POBS rows")
+
+    start = time.perf_counter()
+    merged = merge_imei_rows(frames[0], 'IMEI', frames[1], 'IMEI', frames[2])
+    vectorized = time.perf_counter() - start
+    print(f"  merge_imei_rows {vectorized:9.3f}s")
+
+    if rows <= LEGACY_MAX_ROWS:
+        start = time.perf_counter()
+        legacy = legacy_merge(frames[0], 'IMEI', frames[1], 'IMEI', frames[2])
+        elapsed = time.perf_counter() - start
+        assert legacy[1:] == merged[1:], "match counts differ"
+        pd.testing.assert_frame_equal(legacy[0], merged[0])
+        print(f"  row-by-row loop {elapsed:9.3f}s  x{elapsed / vectorized:.0f}")
+    else:
+        print(f"  row-by-row loop skipped above {LEGACY_MAX_ROWS} rows")
+
+
+if __name__ == '__main__':
+    check()
+    for rows in [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]:
+        run(rows)
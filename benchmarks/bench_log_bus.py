@@ -0,0 +1,79 @@
+"""
+Real-time log bus benchmark
+Messages per second through a shared backend with 8 writer processes, each
+followed by a reader process streaming its session like /api/logs/stream
+
+Usage: python benchmarks/bench_log_bus.py [sqlite|redis] [messages per worker]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.log_bus import create_log_bus  # noqa: E402
+
+WORKERS = 8
+
+
+def writer(backend, session_id, messages, start):
+    bus = create_log_bus(backend)
+    start.wait()
+    for i in range(messages):
+        bus.append(session_id, f"[INFO] Processed {i} records...")
+    bus.append(session_id, "__COMPLETE__")
+
+
+def reader(backend, session_id, start, latencies):
+    bus = create_log_bus(backend)
+    start.wait()
+    last_id = 0
+    received = 0
+    while True:
+        events = bus.read(session_id, last_id)
+        for event_id, message in events:
+            last_id = event_id
+            if message == "__COMPLETE__":
+                latencies.put((received, time.perf_counter()))
+                return
+            received += 1
+        if not events:
+            time.sleep(0.001)
+
+
+def run(backend, messages):
+    bus = create_log_bus(backend)
+    bus.clear()
+    sessions = [f"bench-{i}" for i in range(WORKERS)]
+    for session_id in sessions:
+        bus.create_session(session_id)
+
+    start = multiprocessing.Barrier(WORKERS * 2 + 1)
+    done = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=writer, args=(backend, sid, messages, start)) for sid in sessions]
+    procs += [multiprocessing.Process(target=reader, args=(backend, sid, start, done)) for sid in sessions]
+    for proc in procs:
+        proc.start()
+    start.wait()
+    began = time.perf_counter()
+    finished = [done.get() for _ in sessions]
+    elapsed = max(end for _, end in finished) - began
+    for proc in procs:
+        proc.join()
+
+    total = sum(received for received, _ in finished)
+    assert total == WORKERS * messages, f"lost messages: {total}/{WORKERS * messages}"
+    print(f"{backend}: {WORKERS} workers x {messages} messages delivered in {elapsed:.2f}s "
+          f"-> {total / elapsed:,.0f} msg/s")
+    bus.clear()
+
+
+if __name__ == '__main__':
+    backend = sys.argv[1] if len(sys.argv) > 1 else 'sqlite'
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    if backend == 'sqlite' and not os.getenv('REALTIME_DB_PATH'):
+        os.environ['REALTIME_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench-realtime.db')
+    run(backend, messages)
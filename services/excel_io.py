@@ -0,0 +1,356 @@
+"""
+Excel I/O Service
+Streaming readers for source workbooks that are never written back,
+plus bulk worksheet edits
+"""
+
+import datetime
+import importlib.util
+import logging
+import os
+import re
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence, Union
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+from openpyxl.utils import column_index_from_string
+from pandas.io.parsers import TextParser
+
+# A column can be declared by 0-based index, header name, column letter
+# or a predicate called with the header value
+ColumnSpec = Union[int, str, Callable[[object], bool]]
+
+_COLUMN_LETTERS = re.compile(r"^[A-Za-z]{1,3}$")
+
+# Reader engine for DataFrame reads: auto (fastest installed), calamine or openpyxl
+READER_ENGINE = os.getenv('EXCEL_READER_ENGINE', 'auto').lower()
+
+logger = logging.getLogger(__name__)
+
+
+def calamine_available() -> bool:
+    """True when the Rust-backed python-calamine reader is installed"""
+    return importlib.util.find_spec('python_calamine') is not None
+
+
+def default_engine(path: str) -> str:
+    """Engine pandas picks on its own for a file"""
+    return 'xlrd' if path.lower().endswith('.xls') else 'openpyxl'
+
+
+def select_engine(path: str) -> str:
+    """Engine used for DataFrame reads of a file, honouring EXCEL_READER_ENGINE"""
+    if READER_ENGINE in ('auto', 'calamine') and calamine_available():
+        return 'calamine'
+    return default_engine(path)
+
+
+def read_excel(path: str, **kwargs) -> pd.DataFrame:
+    """
+    pd.read_excel with the fastest available engine
+
+    Falls back to the pandas default engine when the fast reader fails on a
+    file. The engine that served the read is stored in
+    df.attrs['reader_engine'].
+    """
+    engine = select_engine(path)
+    if engine == 'calamine':
+        try:
+            df = pd.read_excel(path, engine='calamine', **kwargs)
+            df.attrs['reader_engine'] = 'calamine'
+            return df
+        except Exception as e:
+            logger.warning("calamine failed on %s, falling back: %s", os.path.basename(path), e)
+            engine = f"{default_engine(path)} (fallback)"
+    df = pd.read_excel(path, **kwargs)
+    df.attrs['reader_engine'] = engine
+    return df
+
+
+def reader_engine(df: pd.DataFrame) -> str:
+    """Engine that produced a frame read through this module"""
+    return df.attrs.get('reader_engine', 'openpyxl')
+
+
+@contextmanager
+def open_readonly_workbook(path: str):
+    """
+    Open a workbook in read-only streaming mode and always release the file
+
+    Cells are parsed lazily row by row instead of building every cell object
+    of every sheet in memory.
+    """
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        yield wb
+    finally:
+        wb.close()
+
+
+def read_sheet_names(path: str) -> List[str]:
+    """Sheet names of a workbook (only the workbook manifest is parsed)"""
+    with open_readonly_workbook(path) as wb:
+        return list(wb.sheetnames)
+
+
+def read_sheet_rows(path: str, sheet_name: Optional[str] = None, max_col: Optional[int] = None) -> Optional[List[tuple]]:
+    """
+    Stream the cell values of a single sheet
+
+    Args:
+        path: Workbook path
+        sheet_name: Sheet to read, None for the active sheet
+        max_col: Last column (1-based) to decode, None for all columns
+
+    Returns:
+        List of row tuples padded to the same width, or None when the sheet
+        does not exist
+    """
+    with open_readonly_workbook(path) as wb:
+        if sheet_name is None:
+            ws = wb.active
+        elif sheet_name in wb.sheetnames:
+            ws = wb[sheet_name]
+        else:
+            return None
+
+        # Dimensions written by some exporters are wrong, rely on the actual cells
+        ws.reset_dimensions()
+        rows = list(ws.iter_rows(max_col=max_col, values_only=True))
+
+    width = max_col or max((len(row) for row in rows), default=0)
+    return [row if len(row) == width else tuple(row) + (None,) * (width - len(row)) for row in rows]
+
+
+def _select_sheet(wb, sheet_name: Union[int, str]):
+    """Pick a sheet the way pd.read_excel does (index or name)"""
+    if isinstance(sheet_name, int):
+        return wb.worksheets[sheet_name]
+    if sheet_name not in wb.sheetnames:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+    return wb[sheet_name]
+
+
+def read_headers(path: str, sheet_name: Union[int, str] = 0) -> List[object]:
+    """Raw values of the header row of a sheet"""
+    with open_readonly_workbook(path) as wb:
+        ws = _select_sheet(wb, sheet_name)
+        ws.reset_dimensions()
+        headers = []
+        for row in ws.iter_rows(max_row=1, values_only=True):
+            headers = list(row)
+    return headers
+
+
+def resolve_columns(headers: Sequence[object], columns: Sequence[ColumnSpec]) -> List[int]:
+    """
+    Translate declared columns into sorted 0-based positions
+
+    Strings are matched against header names first and only then read as
+    column letters. Declared headers missing from the sheet are skipped so
+    callers can keep their own "column not found" handling.
+    """
+    positions = set()
+    for spec in columns:
+        if callable(spec):
+            positions.update(i for i, header in enumerate(headers) if spec(header))
+        elif isinstance(spec, int):
+            positions.add(spec)
+        elif spec in headers:
+            positions.update(i for i, header in enumerate(headers) if header == spec)
+        elif _COLUMN_LETTERS.match(spec):
+            positions.add(column_index_from_string(spec.upper()) - 1)
+    return sorted(positions)
+
+
+def _convert_value(value):
+    """Convert a streamed cell value exactly like pandas' openpyxl reader"""
+    if value is None:
+        return ""
+    if isinstance(value, str) and value in ERROR_CODES:
+        return float("nan")
+    if isinstance(value, float):
+        as_int = int(value)
+        return as_int if as_int == value else value
+    return value
+
+
+def cell_text(value) -> str:
+    """Cell value as read_excel(dtype=str).fillna('') shows it"""
+    # NaN (empty DataFrame cells, error cells) reads as empty
+    if isinstance(value, float) and value != value:
+        return ''
+    value = _convert_value(value)
+    return '' if value != value else str(value)
+
+
+def _convert_calamine(value):
+    """Convert a calamine cell value exactly like pandas' calamine reader"""
+    if isinstance(value, float):
+        as_int = int(value)
+        return as_int if as_int == value else value
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+def _used_width(row) -> int:
+    """Number of leading cells up to the last non-empty one"""
+    for i in range(len(row) - 1, -1, -1):
+        if row[i] is not None:
+            return i + 1
+    return 0
+
+
+def read_frame(path: str, sheet_name: Union[int, str] = 0, columns: Optional[Sequence[ColumnSpec]] = None,
+               dtype=None) -> pd.DataFrame:
+    """
+    Read a sheet into a DataFrame, decoding only the declared columns
+
+    Without columns this is pd.read_excel. With columns, cells outside the
+    requested positions are never converted and the result keeps the source
+    order; df.attrs['source_positions'] holds the original 0-based position
+    of each returned column. Values and dtypes match pd.read_excel, except
+    that trailing rows empty in every declared column are dropped.
+    """
+    if columns is None:
+        return read_excel(path, sheet_name=sheet_name, dtype=dtype)
+    engine = 'openpyxl'
+    if select_engine(path) == 'calamine':
+        try:
+            return _read_frame_calamine(path, sheet_name, columns, dtype)
+        except Exception as e:
+            logger.warning("calamine failed on %s, falling back: %s", os.path.basename(path), e)
+            engine = 'openpyxl (fallback)'
+
+    with open_readonly_workbook(path) as wb:
+        ws = _select_sheet(wb, sheet_name)
+        ws.reset_dimensions()
+        headers = []
+        for row in ws.iter_rows(max_row=1, values_only=True):
+            headers = list(row)
+        positions = resolve_columns(headers, columns)
+        max_col = positions[-1] + 1 if positions else 0
+        rows = list(ws.iter_rows(min_row=2, max_col=max_col, values_only=True)) if positions else []
+
+    # Like pandas, the sheet ends at the last column holding any cell
+    width = max([_used_width(headers)] + [_used_width(row) for row in rows])
+    positions = [i for i in positions if i < width]
+    if not positions:
+        df = pd.DataFrame()
+        df.attrs['source_positions'] = []
+        return df
+
+    # Blank headers keep the name pandas gives them in the full sheet
+    data = [[_convert_value(headers[i]) if i < len(headers) and headers[i] is not None else f"Unnamed: {i}"
+             for i in positions]]
+    for row in rows:
+        data.append([_convert_value(row[i]) if i < len(row) else "" for i in positions])
+    return _parse_rows(data, positions, dtype, engine)
+
+
+def _read_frame_calamine(path: str, sheet_name: Union[int, str], columns: Sequence[ColumnSpec],
+                         dtype) -> pd.DataFrame:
+    """
+    read_frame through python-calamine, converting only the declared columns
+
+    calamine hands over whole rows, but only the declared cells are
+    converted and type-inferred by pandas, which is where a full read
+    spends its time.
+    """
+    from python_calamine import CalamineWorkbook
+
+    wb = CalamineWorkbook.from_path(path)
+    try:
+        if isinstance(sheet_name, int):
+            sheet = wb.get_sheet_by_index(sheet_name)
+        elif sheet_name in wb.sheet_names:
+            sheet = wb.get_sheet_by_name(sheet_name)
+        else:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+        # Rows start at the first sheet row but at the first used column
+        first_col = sheet.start[1] if sheet.start else 0
+        rows = sheet.iter_rows()
+        header_row = next(rows, [])
+        headers = [""] * first_col + list(header_row)
+        positions = resolve_columns(headers, columns)
+        # Like pandas, the sheet ends at the last used column
+        positions = [i for i in positions if i < first_col + len(header_row)]
+        if not positions:
+            df = pd.DataFrame()
+            df.attrs['source_positions'] = []
+            return df
+
+        # Blank headers keep the name pandas gives them in the full sheet
+        data = [[_convert_calamine(headers[i]) if headers[i] != "" else f"Unnamed: {i}" for i in positions]]
+        offsets = [i - first_col for i in positions]
+        for row in rows:
+            data.append(["" if i < 0 else _convert_calamine(row[i]) for i in offsets])
+    finally:
+        wb.close()
+    return _parse_rows(data, positions, dtype, 'calamine')
+
+
+def _parse_rows(data: List[list], positions: List[int], dtype, engine: str) -> pd.DataFrame:
+    """Header row plus data rows of the declared columns into a frame, like pd.read_excel"""
+    # Trim trailing rows empty in every declared column
+    while len(data) > 1 and all(value == "" for value in data[-1]):
+        data.pop()
+
+    df = TextParser(data, header=0, dtype=dtype, skip_blank_lines=False).read()
+    df.attrs['source_positions'] = positions
+    df.attrs['reader_engine'] = engine
+    return df
+
+
+def source_positions(df: pd.DataFrame) -> List[int]:
+    """Original 0-based position of each column of a (possibly projected) frame"""
+    return list(df.attrs.get('source_positions', range(len(df.columns))))
+
+
+def delete_columns(ws, columns: Sequence[str]) -> int:
+    """
+    Delete columns by letter in one pass over the cells
+
+    Same result as calling ws.delete_cols(idx, 1) for each column in the
+    given order, skipping columns past the current last column, but every
+    surviving cell (and its style) is moved once instead of once per delete.
+
+    Returns:
+        Number of columns deleted
+    """
+    # Replay the sequence on column numbers only to know which deletes apply
+    occupied = {column for _, column in ws._cells}
+    deleted = []
+    for letter in columns:
+        idx = column_index_from_string(letter)
+        current_max = max(occupied, default=1)
+        if idx > current_max:
+            continue
+        # delete_cols leaves the shifted block fully populated
+        shifted = set(range(idx, current_max)) if current_max > idx else set()
+        occupied = {column for column in occupied if column < idx} | shifted
+        # Translate back to the original column number
+        original = idx
+        for earlier in sorted(deleted):
+            if earlier <= original:
+                original += 1
+        deleted.append(original)
+
+    if not deleted:
+        return 0
+
+    removed = set(deleted)
+    ordered = sorted(removed)
+    cells = {}
+    for (row, column), cell in ws._cells.items():
+        if column in removed:
+            continue
+        cell.column = column - bisect_left(ordered, column)
+        cells[row, cell.column] = cell
+    ws._cells = cells
+    return len(deleted)
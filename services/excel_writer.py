@@ -0,0 +1,316 @@
+"""
+Excel Writer Service
+Atomic workbook saves: a workbook is serialized once, to a temporary file
+renamed into place, and extra destinations are linked or copied from it.
+Generated sheets are streamed through openpyxl's write-only mode, and
+number formats are registered once per workbook and applied in bulk.
+"""
+
+import datetime
+import errno
+import logging
+import os
+import shutil
+import uuid
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
+from pandas.api.types import is_bool, is_float, is_integer, is_scalar
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# ioctl cloning a file's extents (btrfs, xfs, overlayfs on top of them)
+FICLONE = 0x40049409
+
+# Ways of materializing extra destinations, tried in order; a byte copy is
+# always the last resort. Reflinks share blocks but stay independent files.
+# Hardlinks are opt-in (e.g. 'reflink,hardlink'): a writer that rewrites one
+# name in place would silently change the other.
+COPY_METHODS = [method.strip() for method in
+                os.getenv('WORKBOOK_COPY_METHODS', 'reflink').lower().split(',') if method.strip()]
+
+logger = logging.getLogger(__name__)
+
+
+def _temp_path(path: str) -> str:
+    """Hidden sibling of a destination, so indexes and listings skip it"""
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, f".{filename}.{uuid.uuid4().hex[:8]}.tmp")
+
+
+def _reflink(source: str, target: str):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'reflink not supported')
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def _hardlink(source: str, target: str):
+    os.link(source, target)
+
+
+_COPIERS = {'reflink': _reflink, 'hardlink': _hardlink}
+
+
+def materialize(source: str, destination: str) -> str:
+    """
+    Make destination a copy of source and return how: reflink, hardlink or copy
+
+    Hardlinks (only when listed in WORKBOOK_COPY_METHODS) rely on every
+    writer replacing a path with a new file, as saves through this module
+    and uploads do; a save of one name in place would show through the other.
+    """
+    os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+    tmp_path = _temp_path(destination)
+    try:
+        method = 'copy'
+        for name in COPY_METHODS:
+            copier = _COPIERS.get(name)
+            if copier is None:
+                continue
+            try:
+                copier(source, tmp_path)
+                method = name
+                break
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        if method == 'copy':
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return method
+
+
+def save_workbook(wb, path: str, copies: Iterable[str] = ()) -> Dict[str, str]:
+    """
+    Save a workbook to path and to every copy with a single serialization
+
+    wb is anything with a save(filename) method (openpyxl or xlwt). Readers
+    of any destination see either the previous file or the complete new one.
+
+    Returns:
+        Destination -> how it was written ('saved', 'reflink', 'hardlink' or 'copy')
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = _temp_path(path)
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    written = {path: 'saved'}
+    for copy_path in copies:
+        written[copy_path] = materialize(path, copy_path)
+        logger.debug("Workbook copy %s written by %s", copy_path, written[copy_path])
+    return written
+
+
+# ============================================================================
+# Column formats
+# ============================================================================
+
+class ColumnFormats:
+    """
+    Named number formats of one workbook, applied to cells in bulk
+
+    Assigning cell.number_format looks the format up in the workbook's
+    format list on every cell. Here each format is resolved to its id once,
+    when registered, and applying it only stores that id in the cell's
+    style array: the rest of the style (font, fill, border) is kept, which
+    assigning an openpyxl NamedStyle would reset.
+    """
+
+    # Slot of numFmtId in openpyxl's StyleArray (fontId, fillId, borderId, numFmtId, ...)
+    NUM_FMT_SLOT = 3
+
+    def __init__(self, wb, formats: Optional[Dict[str, str]] = None):
+        self.wb = wb
+        self.ids: Dict[str, int] = {}
+        # Style array of an unstyled cell with each format
+        self.blank: Dict[str, StyleArray] = {}
+        for name, number_format in (formats or {}).items():
+            self.register(name, number_format)
+
+    def register(self, name: str, number_format: str) -> int:
+        """Add a format to the workbook under a name and return its id"""
+        if number_format in BUILTIN_FORMATS_REVERSE:
+            format_id = BUILTIN_FORMATS_REVERSE[number_format]
+        else:
+            format_id = self.wb._number_formats.add(number_format) + BUILTIN_FORMATS_MAX_SIZE
+        self.ids[name] = format_id
+        blank = StyleArray()
+        blank[self.NUM_FMT_SLOT] = format_id
+        self.blank[name] = blank
+        return format_id
+
+    def format_cell(self, cell, name: str):
+        """Apply a registered format to one cell"""
+        if cell._style is None:
+            cell._style = StyleArray(self.blank[name])
+        else:
+            cell._style[self.NUM_FMT_SLOT] = self.ids[name]
+
+    def format_rows(self, ws, column: int, rows: Iterable[int], name: str) -> int:
+        """
+        Apply a registered format to the existing cells of a column
+
+        Args:
+            ws: Worksheet of the workbook the formats belong to
+            column: 1-based column index
+            rows: 1-based row numbers; rows without a cell are skipped
+
+        Returns:
+            Number of cells formatted
+        """
+        format_id = self.ids[name]
+        blank = self.blank[name]
+        slot = self.NUM_FMT_SLOT
+        cells = ws._cells
+        count = 0
+        for row in rows:
+            cell = cells.get((row, column))
+            if cell is None:
+                continue
+            if cell._style is None:
+                cell._style = StyleArray(blank)
+            else:
+                cell._style[slot] = format_id
+            count += 1
+        return count
+
+    def format_column(self, ws, column: int, name: str, min_row: int = 2, max_row: Optional[int] = None) -> int:
+        """Apply a registered format to a whole column range (header excluded by default)"""
+        return self.format_rows(ws, column, range(min_row, (max_row or ws.max_row) + 1), name)
+
+
+# ============================================================================
+# Streaming sheets
+# ============================================================================
+
+# Turns a cell value into (value to write, number format or None)
+CellConverter = Callable[[object], Tuple[object, Optional[str]]]
+
+# Header style DataFrame.to_excel applies (pandas 2.x): bold, thin border, centered
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
+                       top=Side(style='thin'), bottom=Side(style='thin'))
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def frame_value(value) -> Tuple[object, Optional[str]]:
+    """A DataFrame value converted the way DataFrame.to_excel writes it"""
+    if value is None or (is_scalar(value) and pd.isna(value)):
+        return None, None
+    if is_integer(value):
+        return int(value), None
+    if is_float(value):
+        value = float(value)
+        if value in (float('inf'), float('-inf')):
+            return ('inf' if value > 0 else '-inf'), None
+        return value, None
+    if is_bool(value):
+        return bool(value), None
+    if isinstance(value, Decimal):
+        return value, None
+    if isinstance(value, datetime.datetime):
+        return value, 'YYYY-MM-DD HH:MM:SS'
+    if isinstance(value, datetime.date):
+        return value, 'YYYY-MM-DD'
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds() / 86400, '0'
+    return str(value), None
+
+
+def write_sheet(path: str, headers: Sequence[object], rows: Iterable[Sequence[object]],
+                converters: Optional[Dict[int, Sequence[CellConverter]]] = None,
+                default: Optional[CellConverter] = None, title: Optional[str] = None,
+                copies: Iterable[str] = (), header_style: bool = False) -> int:
+    """
+    Stream a header and rows into a new single-sheet workbook, in one pass
+
+    Rows go straight to the file as they are appended (write-only mode), so
+    memory does not grow with the sheet. Each cell is passed through
+    `default`, then through the converters registered for its column (by
+    0-based index) in order; the last number format returned wins.
+
+    Args:
+        path: Destination, written atomically through save_workbook
+        headers: First row
+        rows: Any iterable of row sequences, consumed once
+        converters: Column index -> converters applied to its data cells
+        default: Converter applied to every cell, header included
+        title: Sheet title
+        copies: Extra destinations, see save_workbook
+        header_style: Write the header bold and bordered, like DataFrame.to_excel
+
+    Returns:
+        Number of data rows written
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title)
+    converters = converters or {}
+    # Formats are registered under their own code the first time they show up
+    formats = ColumnFormats(wb)
+
+    def make_cell(value, number_format):
+        if number_format is None:
+            return value
+        if number_format not in formats.ids:
+            formats.register(number_format, number_format)
+        cell = WriteOnlyCell(ws, value)
+        formats.format_cell(cell, number_format)
+        return cell
+
+    header_row = []
+    for header in headers:
+        cell = make_cell(*default(header)) if default else header
+        if header_style:
+            if not isinstance(cell, Cell):
+                cell = WriteOnlyCell(ws, cell)
+            cell.font = HEADER_FONT
+            cell.border = HEADER_BORDER
+            cell.alignment = HEADER_ALIGNMENT
+        header_row.append(cell)
+    ws.append(header_row)
+
+    count = 0
+    for row in rows:
+        if default is None and not converters:
+            ws.append(list(row))
+        else:
+            out = []
+            for i, value in enumerate(row):
+                number_format = None
+                if default is not None:
+                    value, number_format = default(value)
+                for convert in converters.get(i, ()):
+                    value, applied = convert(value)
+                    number_format = applied or number_format
+                out.append(make_cell(value, number_format))
+            ws.append(out)
+        count += 1
+
+    save_workbook(wb, path, copies)
+    return count
+
+
+def write_frame(df: pd.DataFrame, path: str, copies: Iterable[str] = ()) -> int:
+    """Stream a DataFrame to xlsx like df.to_excel(path, index=False) would write it, header style included"""
+    return write_sheet(path, list(df.columns), df.itertuples(index=False, name=None),
+                       default=frame_value, title='Sheet1', copies=copies, header_style=True)
@@ -0,0 +1,292 @@
+"""
+File Index Service
+Filename -> path index of the generated output files, so download, preview,
+delete and listing routes resolve files without probing or walking every
+output directory
+"""
+
+import base64
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# Output folders in the order they are searched when a name exists twice
+OUTPUT_SUBDIRS = [
+    'PCOM', 'POBS', 'IMEI HUB', 'GSPED', 'TRACKING RADAR',
+    'POBS CON TRACKING', 'Backup', 'backup_POBS'
+]
+
+# Historic features and the folders holding their files
+FEATURE_SUBDIRS = {
+    'POBS': ['POBS', 'backup_POBS'],
+    'PCOM': ['PCOM'],
+    'IMEI_HUB': ['IMEI HUB'],
+    'GSPED': ['GSPED'],
+    'TRACKING_RADAR': ['TRACKING RADAR'],
+    'POBS_TRACKING': ['POBS CON TRACKING'],
+    'BACKUP': ['Backup']
+}
+
+# A directory modified this close to its scan may change again within the
+# same mtime tick, so it is rescanned until it settles
+RACY_WINDOW_NS = 2 * 1_000_000_000
+
+
+class FileInfo(NamedTuple):
+    """Indexed stat of one file"""
+    directory: str
+    name: str
+    size: int
+    created: float
+    modified: float
+    mtime_ns: int
+
+
+def _file_info(directory: str, name: str, stat: os.stat_result) -> FileInfo:
+    return FileInfo(directory, name, stat.st_size, stat.st_ctime, stat.st_mtime, stat.st_mtime_ns)
+
+
+def _file_hash(info: FileInfo) -> int:
+    """Stable (cross-process) hash of a file's name, size and mtime"""
+    key = f"{info.name}\0{info.size}\0{info.mtime_ns}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+
+class _DirState:
+    """Last scan of one directory"""
+
+    __slots__ = ('mtime_ns', 'scanned_ns', 'files', 'subdirs', 'fingerprint')
+
+    def __init__(self, mtime_ns: int):
+        self.mtime_ns = mtime_ns
+        self.scanned_ns = time.time_ns()
+        self.files: Dict[str, FileInfo] = {}
+        self.subdirs: Set[str] = set()
+        # XOR of the file hashes, updated incrementally
+        self.fingerprint = 0
+
+    @property
+    def racy(self) -> bool:
+        return self.scanned_ns - self.mtime_ns < RACY_WINDOW_NS
+
+    def put(self, info: FileInfo):
+        old = self.files.get(info.name)
+        if old is not None:
+            self.fingerprint ^= _file_hash(old)
+        self.files[info.name] = info
+        self.fingerprint ^= _file_hash(info)
+
+    def drop(self, name: str):
+        old = self.files.pop(name, None)
+        if old is not None:
+            self.fingerprint ^= _file_hash(old)
+
+
+SORT_FIELDS = ('modified', 'created', 'size', 'name')
+
+
+def encode_cursor(key: tuple) -> str:
+    """Opaque pagination cursor from a sort key"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Sort key of a cursor, raises ValueError if it is malformed"""
+    try:
+        value, directory, name = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    return (value, directory, name)
+
+
+def page_files(files: List[FileInfo], sort: str = 'modified', descending: bool = True,
+               cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[FileInfo], Optional[str]]:
+    """
+    One page of files ordered by a field, after the position of a cursor
+
+    Pages are keyed on (field, directory, name) rather than on offsets, so
+    files added between two requests neither repeat nor skip entries.
+    Returns the page and the cursor of the next one (None on the last page).
+    """
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Unsupported sort field '{sort}'")
+    after = decode_cursor(cursor) if cursor else None
+    if after is not None and not isinstance(after[0], str if sort == 'name' else (int, float)):
+        raise ValueError('Invalid cursor')
+    ordered = sorted(files, key=lambda f: (getattr(f, sort), f.directory, f.name))
+    keys = [(getattr(f, sort), f.directory, f.name) for f in ordered]
+    if descending:
+        end = bisect.bisect_left(keys, after) if after else len(ordered)
+        start = max(0, end - limit)
+        page = ordered[start:end][::-1]
+        more = start > 0
+    else:
+        start = bisect.bisect_right(keys, after) if after else 0
+        end = start + limit
+        page = ordered[start:end]
+        more = end < len(ordered)
+    next_cursor = encode_cursor((getattr(page[-1], sort), page[-1].directory, page[-1].name)) if page and more else None
+    return page, next_cursor
+
+
+class FileIndex:
+    """
+    In-memory index of a directory tree, reconciled by directory mtime
+
+    A directory's mtime changes whenever an entry is added, removed or
+    renamed in it, so a lookup only stats the (few) known directories and
+    rescans the ones that changed. Files written by another worker process
+    are therefore picked up without any notification; services still call
+    register() so their own outputs resolve immediately (and so in-place
+    rewrites, which leave the directory mtime alone, refresh size and mtime).
+    """
+
+    def __init__(self, root: str = 'outputs', priority: Optional[List[str]] = None):
+        self.root = root
+        # Directories searched first, in order; anything else comes after
+        self.priority = priority or [root]
+        self._rank = {path: rank for rank, path in enumerate(self.priority)}
+        self.dirs: Dict[str, _DirState] = {}
+        # file name -> directories containing it
+        self.names: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+
+    def reconcile(self):
+        """Bring the index in line with the file system"""
+        with self.lock:
+            self._reconcile_dir(self.root)
+
+    def lookup(self, filename: str, dirs: Optional[Iterable[str]] = None) -> Optional[str]:
+        """
+        Path of an output file by name, or None
+
+        dirs restricts the match to those directories.
+        """
+        with self.lock:
+            self._reconcile_dir(self.root)
+            candidates = self.names.get(filename)
+            if not candidates:
+                return None
+            if dirs is not None:
+                candidates = candidates.intersection(dirs)
+                if not candidates:
+                    return None
+            directory = min(candidates, key=lambda d: (self._rank.get(d, len(self.priority)), d))
+        return os.path.join(directory, filename)
+
+    def snapshot(self, dirs: Iterable[str]) -> Tuple[List[FileInfo], str]:
+        """
+        Indexed files of some directories and a version tag of that listing
+
+        The tag only depends on names, sizes and mtimes, so every worker
+        computes the same one for the same files.
+        """
+        dirs = list(dirs)
+        with self.lock:
+            self._reconcile_dir(self.root)
+            files: List[FileInfo] = []
+            tag = hashlib.sha1()
+            for directory in dirs:
+                state = self.dirs.get(directory)
+                if state is None:
+                    continue
+                files.extend(state.files.values())
+                tag.update(f"{directory}\0{len(state.files)}\0{state.fingerprint}\0".encode('utf-8'))
+        return files, tag.hexdigest()
+
+    def register(self, path: str):
+        """Record a file just written by this process"""
+        directory, filename = os.path.split(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self.lock:
+            state = self.dirs.get(directory)
+            if state is not None:
+                state.put(_file_info(directory, filename, stat))
+                self.names.setdefault(filename, set()).add(directory)
+
+    def discard(self, path: str):
+        """Forget a file just removed by this process"""
+        directory, filename = os.path.split(path)
+        with self.lock:
+            state = self.dirs.get(directory)
+            if state is not None:
+                state.drop(filename)
+                self._unlink_name(filename, directory)
+
+    def stats(self) -> dict:
+        """Index size for monitoring"""
+        with self.lock:
+            return {
+                'directories': len(self.dirs),
+                'files': sum(len(state.files) for state in self.dirs.values())
+            }
+
+    def _reconcile_dir(self, directory: str):
+        """Rescan a directory if it changed, then its subdirectories (lock held)"""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            self._forget_dir(directory)
+            return
+        state = self.dirs.get(directory)
+        if state is None or state.mtime_ns != mtime_ns or state.racy:
+            state = self._scan(directory, mtime_ns)
+        for subdir in list(state.subdirs):
+            self._reconcile_dir(os.path.join(directory, subdir))
+
+    def _scan(self, directory: str, mtime_ns: int) -> _DirState:
+        previous = self.dirs.get(directory)
+        state = _DirState(mtime_ns)
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Hidden entries hold sidecar data, not downloadable outputs
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir():
+                        state.subdirs.add(entry.name)
+                    elif entry.is_file():
+                        state.put(_file_info(directory, entry.name, entry.stat()))
+                except OSError:
+                    continue
+        old_files = previous.files.keys() if previous else set()
+        for filename in old_files - state.files.keys():
+            self._unlink_name(filename, directory)
+        for filename in state.files.keys() - old_files:
+            self.names.setdefault(filename, set()).add(directory)
+        if previous:
+            for subdir in previous.subdirs - state.subdirs:
+                self._forget_dir(os.path.join(directory, subdir))
+        self.dirs[directory] = state
+        return state
+
+    def _forget_dir(self, directory: str):
+        state = self.dirs.pop(directory, None)
+        if state is None:
+            return
+        for filename in state.files:
+            self._unlink_name(filename, directory)
+        for subdir in state.subdirs:
+            self._forget_dir(os.path.join(directory, subdir))
+
+    def _unlink_name(self, filename: str, directory: str):
+        locations = self.names.get(filename)
+        if locations is not None:
+            locations.discard(directory)
+            if not locations:
+                del self.names[filename]
+
+
+# Global instance
+OUTPUT_ROOT = 'outputs'
+OUTPUT_DIRS = [os.path.join(OUTPUT_ROOT, subdir) for subdir in OUTPUT_SUBDIRS]
+FEATURE_DIRS = {feature: [os.path.join(OUTPUT_ROOT, subdir) for subdir in subdirs]
+                for feature, subdirs in FEATURE_SUBDIRS.items()}
+file_index = FileIndex(OUTPUT_ROOT, [OUTPUT_ROOT] + OUTPUT_DIRS)
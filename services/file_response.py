@@ -0,0 +1,221 @@
+"""
+File Response Service
+Conditional and range responses for output file downloads (RFC 9110):
+strong content-hash ETags, 304/412 preconditions, If-Range, single and
+multipart/byteranges partial content and 416 for unsatisfiable ranges
+"""
+
+import mimetypes
+import os
+import unicodedata
+import uuid
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from flask import Response
+from werkzeug.datastructures import ETags
+from werkzeug.http import http_date, parse_date, parse_etags
+from werkzeug.wsgi import wrap_file
+
+from .workbook_cache import workbook_cache
+
+CHUNK_SIZE = 64 * 1024
+# More ranges than this (after merging) are answered with the full file
+MAX_RANGES = 16
+
+
+def content_etag(path: str) -> str:
+    """Strong ETag of a file: its SHA-256, cached per size and mtime"""
+    return workbook_cache.digest(path)
+
+
+def stat_etag(stat: os.stat_result) -> str:
+    """
+    Validator from mtime and size, without reading the file
+
+    Every save replaces the file (new mtime), so it changes whenever the
+    content does; used where hashing would hold the worker (X-Accel hand-off).
+    """
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def content_disposition(filename: str) -> str:
+    """attachment header with an ASCII fallback and an RFC 5987 UTF-8 name"""
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename, safe="")}'
+
+
+def check_preconditions(environ: dict, etag: str, mtime: float) -> Optional[int]:
+    """
+    Evaluate If-Match, If-Unmodified-Since, If-None-Match and
+    If-Modified-Since in RFC order; returns 412, 304 or None to proceed
+    """
+    method = environ.get('REQUEST_METHOD', 'GET')
+    last_modified = int(mtime)
+
+    if_match = environ.get('HTTP_IF_MATCH')
+    if if_match:
+        if not parse_etags(if_match).contains(etag):
+            return 412
+    else:
+        since = parse_date(environ.get('HTTP_IF_UNMODIFIED_SINCE'))
+        if since is not None and last_modified > since.timestamp():
+            return 412
+
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        if parse_etags(if_none_match).contains_weak(etag):
+            return 304 if method in ('GET', 'HEAD') else 412
+    elif method in ('GET', 'HEAD'):
+        since = parse_date(environ.get('HTTP_IF_MODIFIED_SINCE'))
+        if since is not None and last_modified <= since.timestamp():
+            return 304
+    return None
+
+
+def _if_range_matches(value: str, etag: str, mtime: float) -> bool:
+    """If-Range holds a strong ETag or an exact Last-Modified date"""
+    if value.startswith(('"', 'W/')):
+        etags: ETags = parse_etags(value)
+        return etags.contains(etag)
+    date = parse_date(value)
+    return date is not None and int(date.timestamp()) == int(mtime)
+
+
+def parse_ranges(header: str) -> Optional[List[Tuple[Optional[int], Optional[int]]]]:
+    """
+    Byte range specs of a Range header as (first, last) inclusive pairs
+
+    Suffix ranges ("-500") are (None, 500) and open ranges ("500-") are
+    (500, None). Overlapping specs are allowed here (werkzeug's parser
+    rejects them); returns None for a malformed header.
+    """
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes':
+        return None
+    specs = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        first, sep, last = (part.strip() for part in item.partition('-'))
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+            return None
+        if first and last and int(last) < int(first):
+            return None
+        specs.append((int(first) if first else None, int(last) if last else None))
+    return specs or None
+
+
+def resolve_ranges(header: str, length: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Satisfiable (start, stop) byte ranges of a Range header, merged and sorted
+
+    Returns None when the header should be ignored (unparseable or too many
+    ranges) and an empty list when no range is satisfiable.
+    """
+    specs = parse_ranges(header)
+    if specs is None:
+        return None
+    ranges = []
+    for first, last in specs:
+        if first is None:
+            # Suffix range: the last `last` bytes
+            start, stop = max(0, length - last), length
+        else:
+            start, stop = first, length if last is None else min(last + 1, length)
+        if start < stop:
+            ranges.append((start, stop))
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def _read_ranges(path: str, ranges: List[Tuple[int, int]], parts: Optional[List[bytes]] = None,
+                 closing: bytes = b'') -> Iterator[bytes]:
+    """Yield the bytes of each range, preceded by its multipart header if any"""
+    with open(path, 'rb') as f:
+        for index, (start, stop) in enumerate(ranges):
+            if parts:
+                yield parts[index]
+            f.seek(start)
+            remaining = stop - start
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            if parts:
+                yield b'\r\n'
+    if closing:
+        yield closing
+
+
+def file_response(path: str, download_name: str, environ: dict, etag: Optional[str] = None) -> Response:
+    """
+    Serve a file as an attachment honouring conditional and range headers
+
+    Full responses go through wsgi.file_wrapper so the server can use
+    sendfile; partial responses are streamed in CHUNK_SIZE reads.
+    """
+    stat = os.stat(path)
+    length = stat.st_size
+    etag = etag or content_etag(path)
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    headers = {
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'no-cache',
+        'Content-Disposition': content_disposition(download_name)
+    }
+
+    status = check_preconditions(environ, etag, stat.st_mtime)
+    if status is not None:
+        return Response(status=status, headers=headers)
+
+    range_header = environ.get('HTTP_RANGE')
+    if_range = environ.get('HTTP_IF_RANGE')
+    ranges = None
+    if range_header and environ.get('REQUEST_METHOD', 'GET') == 'GET':
+        if not if_range or _if_range_matches(if_range, etag, stat.st_mtime):
+            ranges = resolve_ranges(range_header, length)
+
+    if ranges is None:
+        headers['Content-Length'] = str(length)
+        body = wrap_file(environ, open(path, 'rb'), CHUNK_SIZE)
+        return Response(body, 200, headers=headers, mimetype=mimetype, direct_passthrough=True)
+
+    if not ranges:
+        headers['Content-Range'] = f'bytes */{length}'
+        return Response(status=416, headers=headers)
+
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+        headers['Content-Length'] = str(stop - start)
+        return Response(_read_ranges(path, ranges), 206, headers=headers, mimetype=mimetype,
+                        direct_passthrough=True)
+
+    boundary = uuid.uuid4().hex
+    parts = [
+        (f'--{boundary}\r\nContent-Type: {mimetype}\r\n'
+         f'Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n').encode('ascii')
+        for start, stop in ranges
+    ]
+    closing = f'--{boundary}--\r\n'.encode('ascii')
+    headers['Content-Length'] = str(sum(len(part) + (stop - start) + 2 for part, (start, stop) in zip(parts, ranges)) + len(closing))
+    return Response(_read_ranges(path, ranges, parts, closing), 206, headers=headers,
+                    content_type=f'multipart/byteranges; boundary={boundary}', direct_passthrough=True)
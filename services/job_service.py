@@ -0,0 +1,308 @@
+"""
+Job Service
+Runs processing operations on a bounded worker pool so HTTP workers are not
+held for the whole Excel pipeline
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows: limits are then per process
+    fcntl = None
+
+from .realtime_logger import realtime_logger
+from .result_storage import result_storage
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class JobLimitExceeded(Exception):
+    """Raised when an operation type already has its maximum number of jobs"""
+
+
+class Job:
+    """A single submitted operation"""
+
+    def __init__(self, operation: str, session_id: Optional[str] = None, manager: Optional["JobManager"] = None,
+                 live: bool = False):
+        self.id = str(uuid.uuid4())
+        self.manager = manager
+        self.operation = operation
+        self.session_id = session_id
+        # The function logs into the session itself while it runs
+        self.live = live
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # Only set while the job is running, then kept in the result store
+        self.result = None
+        self.error = None
+        self.future: Optional[Future] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    def wait(self, timeout: Optional[float] = None) -> dict:
+        """Block until the job finishes and return its result (re-raises its exception)"""
+        self.future.result(timeout)
+        return self.manager.result(self.id)
+
+    def to_dict(self) -> dict:
+        """Public view of the job, without the result payload"""
+        return {
+            'job_id': self.id,
+            'operation': self.operation,
+            'status': self.status,
+            'session_id': self.session_id,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error
+        }
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    """
+    Bounded pool for processing jobs with per-operation admission limits
+
+    The job table and the pool are per process, but admission limits are
+    global: every queued or running job has a marker file in state_dir, and
+    the markers of all gunicorn workers are counted under a file lock.
+    Job state is also written to state_dir so status and result lookups
+    work from any worker.
+    """
+
+    def __init__(self, max_workers: int = 2, limits: Optional[Dict[str, int]] = None,
+                 state_dir: Optional[str] = None, retention: int = 3600):
+        self.max_workers = max_workers
+        self.limits = limits or {}
+        self.state_dir = state_dir or os.path.join(tempfile.gettempdir(), 'easyrent-jobs')
+        self.retention = retention
+        self.jobs: Dict[str, Job] = {}
+        self.lock = threading.Lock()
+        self._executor = None
+        # Marker files of the active jobs of every worker: <operation>.<pid>.<job id>
+        self.active_dir = os.path.join(self.state_dir, 'active')
+        os.makedirs(self.active_dir, exist_ok=True)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Created lazily so gunicorn forks never inherit pool threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        return self._executor
+
+    def submit(self, operation: str, func: Callable[..., dict], *args, session_id: Optional[str] = None,
+               live: bool = False, **kwargs) -> Job:
+        """
+        Queue a service call
+
+        With live, func is a *_realtime service function and gets session_id
+        to stream its log into the session; otherwise the log is replayed
+        into the session when the job ends.
+
+        Raises:
+            JobLimitExceeded: the operation type is at its admission limit
+        """
+        self._purge()
+        job = Job(operation, session_id, manager=self, live=live)
+        if live:
+            kwargs['session_id'] = session_id
+        limit = self.limits.get(operation)
+        with self.lock, self._admission_lock():
+            active = self._active_count(operation)
+            if limit is not None and active >= limit:
+                raise JobLimitExceeded(f"Too many '{operation}' jobs in progress ({active}/{limit}), retry later")
+            self.jobs[job.id] = job
+            open(self._marker_path(job), 'w').close()
+        self._save(job)
+        job.future = self.executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, func: Callable[..., dict], args: tuple, kwargs: dict):
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._save(job)
+        status = FAILED
+        try:
+            job.result = func(*args, **kwargs)
+            status = COMPLETED
+        except Exception as e:
+            job.error = str(e)
+            raise
+        finally:
+            job.finished_at = time.time()
+            # The terminal status is only set once the result is stored, so a
+            # poll never sees a completed job without its result
+            if job.result is not None:
+                result_storage.store_result(job.id, job.result)
+            job.status = status
+            self._save(job)
+            self._release(job)
+            self._publish(job)
+            # The future and the job table outlive the request, the payload
+            # only lives in the bounded result store and the state file
+            job.result = None
+
+    @contextmanager
+    def _admission_lock(self):
+        """Serialize admission across the worker processes sharing state_dir"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.state_dir, '.admission.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _marker_path(self, job: Job) -> str:
+        return os.path.join(self.active_dir, f"{job.operation}.{os.getpid()}.{job.id}")
+
+    def _active_count(self, operation: str) -> int:
+        """Queued and running jobs of an operation in every worker (admission lock held)"""
+        active = 0
+        prefix = f"{operation}."
+        for name in os.listdir(self.active_dir):
+            if not name.startswith(prefix):
+                continue
+            pid = name[len(prefix):].split('.', 1)[0]
+            if pid.isdigit() and _process_alive(int(pid)):
+                active += 1
+            else:
+                # Left behind by a worker that died mid-job
+                try:
+                    os.remove(os.path.join(self.active_dir, name))
+                except OSError:
+                    pass
+        return active
+
+    def _release(self, job: Job):
+        try:
+            os.remove(self._marker_path(job))
+        except OSError:
+            pass
+
+    def _publish(self, job: Job):
+        """Replay the processing log and result into the job's real-time session"""
+        if not job.session_id:
+            return
+        if job.live:
+            # The function already streamed its log and result, unless it raised
+            if job.result is None:
+                realtime_logger.log_error(job.session_id, job.error or 'Job failed')
+                realtime_logger.store_result(job.session_id, {'success': False, 'error': job.error})
+                realtime_logger.complete_session(job.session_id)
+            return
+        result = job.result if job.result is not None else {'success': False, 'error': job.error}
+        for line in result.get('processing_log') or []:
+            realtime_logger.log(job.session_id, line, level=None)
+        realtime_logger.store_result(job.session_id, result)
+        realtime_logger.complete_session(job.session_id)
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save(self, job: Job):
+        """Write the job state atomically for the other workers"""
+        state = job.to_dict()
+        state['result'] = job.result
+        tmp_path = f"{self._state_path(job.id)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, default=str)
+        os.replace(tmp_path, self._state_path(job.id))
+
+    def result(self, job_id: str) -> Optional[dict]:
+        """Result of a finished job, from the result store or the state file"""
+        result = result_storage.get_result(job_id)
+        if result is None:
+            state = self._load(job_id)
+            result = state.get('result') if state else None
+        return result
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Job state including the result, from memory or from the shared state dir"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None:
+            state = job.to_dict()
+            state['result'] = self.result(job_id) if job.status == COMPLETED else None
+            return state
+        return self._load(job_id)
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        # Reject anything that is not a job id before touching the filesystem
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return None
+        try:
+            with open(self._state_path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _purge(self):
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job.done and job.finished_at < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
+        for job_id in expired:
+            result_storage.clear_result(job_id)
+        # State files of every worker share the directory, expire them by age
+        for entry in os.scandir(self.state_dir):
+            try:
+                if entry.name.endswith('.json') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """Job counts by operation and status"""
+        with self.lock:
+            counts: Dict[str, Dict[str, int]] = {}
+            for job in self.jobs.values():
+                counts.setdefault(job.operation, {}).setdefault(job.status, 0)
+                counts[job.operation][job.status] += 1
+        return {'max_workers': self.max_workers, 'limits': self.limits, 'jobs': counts}
+
+
+# Global instance
+job_manager = JobManager(
+    max_workers=int(os.getenv('JOB_WORKERS', '2')),
+    limits={
+        'pobs': int(os.getenv('JOB_LIMIT_POBS', '2')),
+        'pcom': int(os.getenv('JOB_LIMIT_PCOM', '2')),
+        'tracking': int(os.getenv('JOB_LIMIT_TRACKING', '2'))
+    },
+    state_dir=os.getenv('JOB_STATE_DIR'),
+    retention=int(os.getenv('JOB_RETENTION_SECONDS', '3600'))
+)
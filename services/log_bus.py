@@ -0,0 +1,523 @@
+"""
+Log Bus Service
+Storage backends for real-time session logs and results, so every gunicorn
+worker sees the same sessions
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .result_storage import ResultStorage, result_storage
+
+# (event id, message) with ids 1, 2, 3... within a session
+Event = Tuple[int, str]
+
+
+class LogBus:
+    """
+    Interface of a session log backend
+
+    Each session keeps a ring buffer of its latest events, bounded by
+    max_events and max_bytes; older events are dropped but ids keep
+    increasing, so a reader resuming after a trimmed id sees the gap.
+    Sessions (finished or not) are removed ttl seconds after creation,
+    results ttl seconds after they were stored.
+    """
+
+    name = 'base'
+    # True when other processes write to the same sessions
+    shared = False
+
+    def __init__(self, max_events: int = 5000, max_bytes: int = 1024 * 1024, ttl: int = 3600):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def create_session(self, session_id: str):
+        raise NotImplementedError
+
+    def session_exists(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def append(self, session_id: str, message: str) -> Optional[int]:
+        """Append a message, returns its event id or None if the session does not exist"""
+        raise NotImplementedError
+
+    def read(self, session_id: str, after_id: int = 0, limit: int = 1000) -> List[Event]:
+        """Buffered events of a session with an id greater than after_id"""
+        raise NotImplementedError
+
+    def mark_complete(self, session_id: str):
+        """Flag a session as finished; its buffer stays readable until it expires"""
+        raise NotImplementedError
+
+    def delete_session(self, session_id: str):
+        """Drop the session log (the result is kept)"""
+        raise NotImplementedError
+
+    def set_result(self, session_id: str, result: dict):
+        raise NotImplementedError
+
+    def get_result(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def delete_result(self, session_id: str):
+        raise NotImplementedError
+
+    def result_stats(self) -> dict:
+        """Counters of the stored results for monitoring"""
+        return {}
+
+    def list_sessions(self) -> List[str]:
+        """Sessions that are not complete yet"""
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Drop sessions and results older than the ttl"""
+        raise NotImplementedError
+
+    def clear(self):
+        """Drop every session and result"""
+        raise NotImplementedError
+
+    def change_token(self):
+        """
+        Value that changes whenever another process writes to the bus
+
+        Only polled for shared backends; in-process writes are notified
+        directly.
+        """
+        return None
+
+
+class _MemorySession:
+    """Ring buffer of one session"""
+
+    def __init__(self):
+        self.created_at = time.time()
+        self.events: Deque[Event] = deque()
+        self.last_id = 0
+        self.bytes = 0
+        self.complete = False
+
+
+class MemoryLogBus(LogBus):
+    """Process-local backend, only correct with a single worker process"""
+
+    name = 'memory'
+
+    def __init__(self, results: Optional[ResultStorage] = None, **limits):
+        super().__init__(**limits)
+        self.sessions: Dict[str, _MemorySession] = {}
+        # Bounded by the result store's TTL and memory budget
+        self.results = results or result_storage
+        self.lock = threading.Lock()
+
+    def create_session(self, session_id: str):
+        with self.lock:
+            self.sessions[session_id] = _MemorySession()
+
+    def session_exists(self, session_id: str) -> bool:
+        with self.lock:
+            return session_id in self.sessions
+
+    def append(self, session_id: str, message: str) -> Optional[int]:
+        size = len(message.encode('utf-8'))
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            session.last_id += 1
+            session.events.append((session.last_id, message))
+            session.bytes += size
+            while len(session.events) > 1 and (len(session.events) > self.max_events or session.bytes > self.max_bytes):
+                _, dropped = session.events.popleft()
+                session.bytes -= len(dropped.encode('utf-8'))
+            return session.last_id
+
+    def read(self, session_id: str, after_id: int = 0, limit: int = 1000) -> List[Event]:
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None or not session.events:
+                return []
+            # Ids in the buffer are contiguous, so the position is known
+            start = max(0, after_id - session.events[0][0] + 1)
+            return [session.events[i] for i in range(start, min(start + limit, len(session.events)))]
+
+    def mark_complete(self, session_id: str):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.complete = True
+
+    def delete_session(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def set_result(self, session_id: str, result: dict):
+        self.results.store_result(session_id, result)
+
+    def get_result(self, session_id: str) -> Optional[dict]:
+        return self.results.get_result(session_id)
+
+    def delete_result(self, session_id: str):
+        self.results.clear_result(session_id)
+
+    def result_stats(self) -> dict:
+        return self.results.stats()
+
+    def list_sessions(self) -> List[str]:
+        with self.lock:
+            return [session_id for session_id, session in self.sessions.items() if not session.complete]
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        with self.lock:
+            for session_id in [sid for sid, session in self.sessions.items() if session.created_at < cutoff]:
+                del self.sessions[session_id]
+
+    def clear(self):
+        with self.lock:
+            self.sessions.clear()
+        self.results.clear_all_results()
+
+
+class SQLiteLogBus(LogBus):
+    """
+    Shared backend on a local SQLite database in WAL mode
+
+    Readers never block writers, so streams polling from other workers do
+    not slow down the processing threads appending log lines. Results are
+    bounded by the ttl and by results_max_bytes, least recently read first.
+    """
+
+    name = 'sqlite'
+    shared = True
+
+    def __init__(self, path: str, results_max_bytes: int = 64 * 1024 * 1024, **limits):
+        super().__init__(**limits)
+        self.path = path
+        self.results_max_bytes = results_max_bytes
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS log_sessions (
+                session_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                last_event_id INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                complete INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS log_events (
+                session_id TEXT NOT NULL,
+                event_id INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (session_id, event_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS log_results (
+                session_id TEXT PRIMARY KEY,
+                stored_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                accessed_at REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS log_results_stored_at ON log_results (stored_at);
+        """)
+        # Databases created before results had an LRU order
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(log_results)')]
+        if 'accessed_at' not in columns:
+            conn.execute('ALTER TABLE log_results ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0')
+        conn.execute('CREATE INDEX IF NOT EXISTS log_results_accessed_at ON log_results (accessed_at)')
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (and per process, after a fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create_session(self, session_id: str):
+        self._conn().execute('INSERT OR REPLACE INTO log_sessions (session_id, created_at) VALUES (?, ?)',
+                             (session_id, time.time()))
+
+    def session_exists(self, session_id: str) -> bool:
+        row = self._conn().execute('SELECT 1 FROM log_sessions WHERE session_id = ?', (session_id,)).fetchone()
+        return row is not None
+
+    def append(self, session_id: str, message: str) -> Optional[int]:
+        size = len(message.encode('utf-8'))
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'UPDATE log_sessions SET last_event_id = last_event_id + 1, bytes = bytes + ? '
+                'WHERE session_id = ? RETURNING last_event_id, bytes',
+                (size, session_id)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            event_id, total_bytes = row
+            conn.execute('INSERT INTO log_events (session_id, event_id, message, size) VALUES (?, ?, ?, ?)',
+                         (session_id, event_id, message, size))
+            if event_id > self.max_events or total_bytes > self.max_bytes:
+                self._trim(conn, session_id, event_id, total_bytes)
+            conn.execute('COMMIT')
+            return event_id
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _trim(self, conn: sqlite3.Connection, session_id: str, last_id: int, total_bytes: int):
+        """Drop the oldest events beyond the count and byte limits"""
+        cutoff = last_id - self.max_events
+        dropped = conn.execute('SELECT COALESCE(SUM(size), 0) FROM log_events WHERE session_id = ? AND event_id <= ?',
+                               (session_id, cutoff)).fetchone()[0]
+        remaining = total_bytes - dropped
+        if remaining > self.max_bytes:
+            # Walk forward from the oldest kept event until under the byte budget
+            for event_id, size in conn.execute(
+                    'SELECT event_id, size FROM log_events WHERE session_id = ? AND event_id > ? AND event_id < ? '
+                    'ORDER BY event_id', (session_id, cutoff, last_id)).fetchall():
+                cutoff = event_id
+                remaining -= size
+                dropped += size
+                if remaining <= self.max_bytes:
+                    break
+        if dropped:
+            conn.execute('DELETE FROM log_events WHERE session_id = ? AND event_id <= ?', (session_id, cutoff))
+            conn.execute('UPDATE log_sessions SET bytes = bytes - ? WHERE session_id = ?', (dropped, session_id))
+
+    def read(self, session_id: str, after_id: int = 0, limit: int = 1000) -> List[Event]:
+        return self._conn().execute(
+            'SELECT event_id, message FROM log_events WHERE session_id = ? AND event_id > ? ORDER BY event_id LIMIT ?',
+            (session_id, after_id, limit)
+        ).fetchall()
+
+    def mark_complete(self, session_id: str):
+        self._conn().execute('UPDATE log_sessions SET complete = 1 WHERE session_id = ?', (session_id,))
+
+    def delete_session(self, session_id: str):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM log_events WHERE session_id = ?', (session_id,))
+            conn.execute('DELETE FROM log_sessions WHERE session_id = ?', (session_id,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def set_result(self, session_id: str, result: dict):
+        payload = json.dumps(result, default=str)
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT OR REPLACE INTO log_results (session_id, stored_at, size, result, accessed_at) '
+                         'VALUES (?, ?, ?, ?, ?)', (session_id, now, len(payload), payload, now))
+            self._evict_results(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict_results(self, conn: sqlite3.Connection):
+        """Drop the least recently read results beyond the byte budget"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM log_results').fetchone()[0]
+        if total <= self.results_max_bytes:
+            return
+        # Keep the most recently read results that fit, the newest one always
+        conn.execute(
+            'DELETE FROM log_results WHERE session_id IN ('
+            ' SELECT session_id FROM ('
+            '  SELECT session_id, SUM(size) OVER (ORDER BY accessed_at DESC, session_id) AS kept'
+            '  FROM log_results)'
+            ' WHERE kept > ? AND session_id != ('
+            '  SELECT session_id FROM log_results ORDER BY accessed_at DESC, session_id LIMIT 1))',
+            (self.results_max_bytes,))
+
+    def get_result(self, session_id: str) -> Optional[dict]:
+        conn = self._conn()
+        row = conn.execute('SELECT result FROM log_results WHERE session_id = ? AND stored_at >= ?',
+                           (session_id, time.time() - self.ttl)).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE log_results SET accessed_at = ? WHERE session_id = ?', (time.time(), session_id))
+        return json.loads(row[0])
+
+    def delete_result(self, session_id: str):
+        self._conn().execute('DELETE FROM log_results WHERE session_id = ?', (session_id,))
+
+    def result_stats(self) -> dict:
+        entries, total = self._conn().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM log_results').fetchone()
+        return {'entries': entries, 'disk_bytes': total, 'max_bytes': self.results_max_bytes, 'ttl': self.ttl}
+
+    def list_sessions(self) -> List[str]:
+        return [row[0] for row in self._conn().execute(
+            'SELECT session_id FROM log_sessions WHERE complete = 0 ORDER BY created_at')]
+
+    def purge_expired(self):
+        conn = self._conn()
+        cutoff = time.time() - self.ttl
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM log_events WHERE session_id IN '
+                         '(SELECT session_id FROM log_sessions WHERE created_at < ?)', (cutoff,))
+            conn.execute('DELETE FROM log_sessions WHERE created_at < ?', (cutoff,))
+            conn.execute('DELETE FROM log_results WHERE stored_at < ?', (cutoff,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def clear(self):
+        self._conn().executescript('DELETE FROM log_events; DELETE FROM log_sessions; DELETE FROM log_results;')
+
+    def change_token(self):
+        # Bumped by commits of any other connection, costs no disk read
+        return self._conn().execute('PRAGMA data_version').fetchone()[0]
+
+
+class RedisLogBus(LogBus):
+    """
+    Shared backend on any Redis-compatible server (Redis, Valkey, KeyDB...)
+
+    Each session is a list of "id:message" entries plus counters for the
+    last id and the buffered bytes.
+    """
+
+    name = 'redis'
+    shared = True
+
+    # Append, then trim the oldest entries beyond the limits, atomically
+    APPEND_SCRIPT = """
+        if redis.call('ZSCORE', KEYS[1], ARGV[1]) == false then return false end
+        local id = redis.call('HINCRBY', KEYS[3], 'last_id', 1)
+        local size = tonumber(ARGV[3])
+        local total = redis.call('HINCRBY', KEYS[3], 'bytes', size)
+        redis.call('RPUSH', KEYS[2], id .. ':' .. ARGV[2])
+        redis.call('RPUSH', KEYS[4], size)
+        while redis.call('LLEN', KEYS[2]) > 1 and
+              (redis.call('LLEN', KEYS[2]) > tonumber(ARGV[4]) or total > tonumber(ARGV[5])) do
+            redis.call('LPOP', KEYS[2])
+            total = redis.call('HINCRBY', KEYS[3], 'bytes', -tonumber(redis.call('LPOP', KEYS[4])))
+        end
+        for i = 2, 4 do redis.call('EXPIRE', KEYS[i], ARGV[6]) end
+        redis.call('INCR', KEYS[5])
+        return id
+    """
+
+    def __init__(self, url: str, prefix: str = 'easyrent:rt:', **limits):
+        super().__init__(**limits)
+        import redis  # Optional dependency, only needed for this backend
+
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._append = self.client.register_script(self.APPEND_SCRIPT)
+
+    def _key(self, kind: str, session_id: str = '') -> str:
+        return f"{self.prefix}{kind}:{session_id}" if session_id else f"{self.prefix}{kind}"
+
+    def _session_keys(self, session_id: str) -> List[str]:
+        return [self._key(kind, session_id) for kind in ('log', 'meta', 'sizes')]
+
+    def create_session(self, session_id: str):
+        pipe = self.client.pipeline()
+        pipe.delete(*self._session_keys(session_id))
+        pipe.zadd(self._key('sessions'), {session_id: time.time()})
+        pipe.execute()
+
+    def session_exists(self, session_id: str) -> bool:
+        return self.client.zscore(self._key('sessions'), session_id) is not None
+
+    def append(self, session_id: str, message: str) -> Optional[int]:
+        log_key, meta_key, sizes_key = self._session_keys(session_id)
+        event_id = self._append(
+            keys=[self._key('sessions'), log_key, meta_key, sizes_key, self._key('version')],
+            args=[session_id, message, len(message.encode('utf-8')), self.max_events, self.max_bytes, self.ttl]
+        )
+        return int(event_id) if event_id else None
+
+    def read(self, session_id: str, after_id: int = 0, limit: int = 1000) -> List[Event]:
+        events = []
+        for entry in self.client.lrange(self._key('log', session_id), 0, -1):
+            event_id, message = entry.split(':', 1)
+            if int(event_id) > after_id:
+                events.append((int(event_id), message))
+                if len(events) >= limit:
+                    break
+        return events
+
+    def mark_complete(self, session_id: str):
+        self.client.hset(self._key('meta', session_id), 'complete', 1)
+
+    def delete_session(self, session_id: str):
+        pipe = self.client.pipeline()
+        pipe.delete(*self._session_keys(session_id))
+        pipe.zrem(self._key('sessions'), session_id)
+        pipe.execute()
+
+    def set_result(self, session_id: str, result: dict):
+        self.client.set(self._key('result', session_id), json.dumps(result, default=str), ex=self.ttl)
+
+    def get_result(self, session_id: str) -> Optional[dict]:
+        value = self.client.get(self._key('result', session_id))
+        return json.loads(value) if value else None
+
+    def delete_result(self, session_id: str):
+        self.client.delete(self._key('result', session_id))
+
+    def list_sessions(self) -> List[str]:
+        sessions = self.client.zrange(self._key('sessions'), 0, -1)
+        return [session_id for session_id in sessions
+                if not self.client.hget(self._key('meta', session_id), 'complete')]
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl
+        for session_id in self.client.zrangebyscore(self._key('sessions'), 0, cutoff):
+            self.delete_session(session_id)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def change_token(self):
+        return self.client.get(self._key('version'))
+
+
+def create_log_bus(backend: Optional[str] = None) -> LogBus:
+    """
+    Build the backend selected by REALTIME_BACKEND (sqlite, redis or memory)
+
+    sqlite uses REALTIME_DB_PATH, redis uses REALTIME_REDIS_URL. Buffers are
+    bounded by REALTIME_MAX_EVENTS and REALTIME_MAX_KB per session, sessions
+    expire after REALTIME_SESSION_TTL seconds. sqlite keeps at most
+    RESULT_MAX_MB of results, like the in-memory result store.
+    """
+    backend = (backend or os.getenv('REALTIME_BACKEND', 'sqlite')).lower()
+    limits = {
+        'max_events': int(os.getenv('REALTIME_MAX_EVENTS', '5000')),
+        'max_bytes': int(os.getenv('REALTIME_MAX_KB', '1024')) * 1024,
+        'ttl': int(os.getenv('REALTIME_SESSION_TTL', '3600'))
+    }
+    if backend == 'memory':
+        return MemoryLogBus(**limits)
+    if backend == 'redis':
+        return RedisLogBus(os.getenv('REALTIME_REDIS_URL', 'redis://127.0.0.1:6379/0'), **limits)
+    if backend == 'sqlite':
+        path = os.getenv('REALTIME_DB_PATH') or os.path.join(tempfile.gettempdir(), 'easyrent-realtime.db')
+        return SQLiteLogBus(path, results_max_bytes=int(os.getenv('RESULT_MAX_MB', '64')) * 1024 * 1024, **limits)
+    raise ValueError(f"Unknown real-time backend '{backend}'")
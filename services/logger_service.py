@@ -7,6 +7,7 @@ import os
 import json
 from datetime import datetime
 from typing import Dict, List, Any, Optional
+from .workbook_cache import workbook_cache
 
 class OperationLogger:
     """Centralized logger for all EasyRent operations"""
@@ -38,6 +39,13 @@ class OperationLogger:
             Path to the log file created
         """
         timestamp = datetime.now()
+
+        # Report which reader engine decoded each input of the operation
+        engines = workbook_cache.reader_engines()
+        if engines:
+            details = dict(details or {})
+            details['excel_reader_engines'] = ", ".join(f"{name}: {engine}" for name, engine in engines.items())
+
         log_filename = f"{operation_type}_{operation_name}_{timestamp.strftime('%Y%m%d_%H%M%S')}.log"
         log_path = os.path.join(self.logs_dir, log_filename)
 
@@ -13,6 +13,20 @@ from datetime import datetime
 from openpyxl import load_workbook
 from .logger_service import log_pcom_operation
 from .realtime_logger import realtime_logger
+from .workbook_cache import workbook_cache
+from .excel_io import delete_columns
+from .excel_writer import save_workbook, write_frame
+from .file_index import file_index
+from .preview_service import write_preview_sidecar
+
+def is_status_column(header):
+    """Header predicate for the columns checked by filter_resolved_rejected_status"""
+    return isinstance(header, str) and header.upper() in ['STATO', 'STATUS']
+
+# Noleggio columns needed by process_pcom_files: critical columns A-J and status
+PCOM_NOLEGGIO_COLUMNS = list(range(0, 10)) + [is_status_column]
+# SOHO columns read by the PCOM processing (A, H, I)
+PCOM_SOHO_COLUMNS = [0, 7, 8]
 
 def filter_resolved_rejected_status(df, log_function=None):
     """
@@ -76,7 +90,7 @@ def clean_model(text: str):
 def load_mapping(modelli_path=None):
     """Load model mapping from Excel file"""
     if modelli_path and os.path.isfile(modelli_path):
-        df = pd.read_excel(modelli_path, sheet_name=0)
+        df = workbook_cache.read_excel(modelli_path, sheet_name=0)
     else:
         raise FileNotFoundError("File Modelli Easyrent.xlsx missing")
 
@@ -89,6 +103,7 @@ def load_mapping(modelli_path=None):
     )
     return mapping.drop_duplicates().set_index("Versione").to_dict(orient="index")
 
+@workbook_cache.operation()
 def process_pcom_with_pobs(noleggio_path, soho_path, pobs_path, output_dir, modelli_path, options, custom_names=None):
     """
     Process PCOM files and optionally update POBS
@@ -155,6 +170,7 @@ def process_pcom_with_pobs(noleggio_path, soho_path, pobs_path, output_dir, mode
             'error': str(e)
         }
 
+@workbook_cache.operation()
 def process_pobs_update(pobs_path, noleggio_path, dest_folder, custom_name):
     """
     Update POBS file with new records from Noleggio
@@ -172,9 +188,8 @@ def process_pobs_update(pobs_path, noleggio_path, dest_folder, custom_name):
         headers = [c.value for c in ws_pobs[1]]
 
         log("[POBS] Opening Noleggio file...")
-        wb_noleggio = load_workbook(noleggio_path, data_only=True)
-        ws_nol = wb_noleggio.active
-        headers_nol = [c.value for c in ws_nol[1]]
+        nol_rows = workbook_cache.read_sheet_values(noleggio_path)
+        headers_nol = list(nol_rows[0]) if nol_rows else []
 
         # Column mapping from script 1
         mapping = {
@@ -210,30 +225,58 @@ def process_pobs_update(pobs_path, noleggio_path, dest_folder, custom_name):
             "DATA RIENTRO.1": None,
         }
 
+        # Compile the mapping once: constant value or Noleggio column index per POBS column
+        plan = []
+        for col_pobs, col_nol in mapping.items():
+            if col_nol is None:
+                plan.append((None, ""))
+            elif col_nol == "IN GESTIONE":
+                plan.append((None, "IN GESTIONE"))
+            else:
+                plan.append((headers_nol.index(col_nol) if col_nol in headers_nol else None, ""))
+        date_col = list(mapping).index("Data/ora creazione")
+
+        # Skip Noleggio rows whose POBS ID is already in the history file (same match as verify_new_records)
+        key_pobs = headers.index("POBS ID") if "POBS ID" in headers else None
+        key_nol = headers_nol.index("POBS ID") if "POBS ID" in headers_nol else None
+        existing_ids = set()
+        if key_pobs is not None and key_nol is not None:
+            for (pobs_id,) in ws_pobs.iter_rows(min_row=2, min_col=key_pobs + 1, max_col=key_pobs + 1, values_only=True):
+                if pobs_id is not None:
+                    existing_ids.add(str(pobs_id).strip().upper())
+        else:
+            log("[POBS] POBS ID column missing, existing records not checked")
+
         log("[POBS] Adding new rows...")
-        records_added = 0
-        for r in range(2, ws_nol.max_row+1):
-            new_row = []
-            for col_pobs, col_nol in mapping.items():
-                if col_nol is None:
-                    val = ""
-                elif col_nol == "IN GESTIONE":
-                    val = "IN GESTIONE"
-                else:
-                    col_idx = headers_nol.index(col_nol)+1 if col_nol in headers_nol else None
-                    val = ws_nol.cell(row=r, column=col_idx).value if col_idx else ""
-                    # Format date if needed
-                    if col_pobs == "Data/ora creazione" and val:
-                        if hasattr(val, "strftime"):
-                            val = val.strftime("%d/%m/%Y")
-                new_row.append(val)
+        new_rows = []
+        duplicates_skipped = 0
+        for nol_row in nol_rows[1:]:
+            if existing_ids and key_nol < len(nol_row) and nol_row[key_nol] is not None \
+                    and str(nol_row[key_nol]).strip().upper() in existing_ids:
+                duplicates_skipped += 1
+                continue
+            new_rows.append([
+                nol_row[col_idx] if col_idx is not None and col_idx < len(nol_row) else default
+                for col_idx, default in plan
+            ])
+
+        # Format creation dates of the whole column in one pass
+        for new_row in new_rows:
+            val = new_row[date_col]
+            if val and hasattr(val, "strftime"):
+                new_row[date_col] = val.strftime("%d/%m/%Y")
+
+        for new_row in new_rows:
             ws_pobs.append(new_row)
-            records_added += 1
+        records_added = len(new_rows)
+        if duplicates_skipped:
+            log(f"[POBS] Skipped {duplicates_skipped} rows already in the POBS file")
 
         # Create backup
         backup_dir = Path(dest_folder) / "backup_POBS"
         backup_dir.mkdir(parents=True, exist_ok=True)
         shutil.copy(str(pobs_path), str(backup_dir / Path(pobs_path).name))
+        file_index.register(str(backup_dir / Path(pobs_path).name))
 
         # Create POBS output directory
         pobs_dir = os.path.join(dest_folder, "POBS")
@@ -246,12 +289,15 @@ def process_pobs_update(pobs_path, noleggio_path, dest_folder, custom_name):
         out_path = os.path.join(pobs_dir, out_name)
 
         log(f"[POBS] Saving to: {out_path}")
-        wb_pobs.save(out_path)
+        save_workbook(wb_pobs, out_path)
+        file_index.register(out_path)
+        write_preview_sidecar(out_path, wb_pobs)
 
         return {
             'success': True,
             'message': f'Successfully added {records_added} records to POBS',
             'records_added': records_added,
+            'duplicates_skipped': duplicates_skipped,
             'output_file': out_name,
             'processing_log': processing_log,
             'download_file': out_name
@@ -263,6 +309,7 @@ def process_pobs_update(pobs_path, noleggio_path, dest_folder, custom_name):
             'error': str(e)
         }
 
+@workbook_cache.operation()
 def process_pcom_files(noleggio_path, soho_path, output_dir, modelli_path, options, custom_name=None):
     """
     Process PCOM files
@@ -288,27 +335,27 @@ def process_pcom_files(noleggio_path, soho_path, output_dir, modelli_path, optio
 
         log("[INFO] Opening SOHO file...")
         # Open SOHO file and find the correct sheet
-        wb_soho = load_workbook(soho_path, data_only=True)
+        soho_sheetnames = workbook_cache.read_sheet_names(soho_path)
         soho_sheet = None
-        for name in wb_soho.sheetnames:
+        for name in soho_sheetnames:
             if "Modulo Ordini" in name:
                 soho_sheet = name
                 break
         if not soho_sheet:
-            soho_sheet = wb_soho.sheetnames[0]
+            soho_sheet = soho_sheetnames[0]
             log(f"[INFO] Using first sheet: {soho_sheet}")
         else:
             log(f"[INFO] Using sheet: {soho_sheet}")
 
-        ws_soho = wb_soho[soho_sheet]
+        soho_rows = workbook_cache.read_sheet_values(soho_path, soho_sheet, max_col=9)
 
         # Build SOHO mappings
         soho_map_notes = {}
         soho_map_imei = {}
-        for row in range(10, ws_soho.max_row+1):
-            id_val = ws_soho.cell(row=row, column=1).value   # col A
-            note_val = ws_soho.cell(row=row, column=8).value # col H
-            imei_val = ws_soho.cell(row=row, column=9).value # col I
+        for soho_row in soho_rows[9:]:
+            id_val = soho_row[0] if len(soho_row) > 0 else None    # col A
+            note_val = soho_row[7] if len(soho_row) > 7 else None  # col H
+            imei_val = soho_row[8] if len(soho_row) > 8 else None  # col I
             if id_val:
                 pid = str(id_val).strip()
                 if note_val not in (None, ""):
@@ -398,17 +445,8 @@ def process_pcom_files(noleggio_path, soho_path, output_dir, modelli_path, optio
         # Delete unnecessary columns if requested
         if options.get("clean", False):
             log("[INFO] Cleaning unnecessary columns...")
-            from openpyxl.utils import column_index_from_string
             cols_to_delete = ["AB","AA","Z","Y","X","W","V","U","T","M","L","K","I","F","E","D","C","B","A"]
-            deleted_count = 0
-            for col in cols_to_delete:
-                try:
-                    idx = column_index_from_string(col)
-                    if idx <= ws.max_column:
-                        ws.delete_cols(idx, 1)
-                        deleted_count += 1
-                except:
-                    pass
+            deleted_count = delete_columns(ws, cols_to_delete)
             log(f"[INFO] Deleted {deleted_count} unnecessary columns")
 
         # Create PCOM output directory
@@ -426,7 +464,9 @@ def process_pcom_files(noleggio_path, soho_path, output_dir, modelli_path, optio
         output_path = os.path.join(pcom_dir, output_filename)
 
         log(f"[INFO] Saving to: {output_path}")
-        wb_noleggio.save(output_path)
+        save_workbook(wb_noleggio, output_path)
+        file_index.register(output_path)
+        write_preview_sidecar(output_path, wb_noleggio)
 
         log("[INFO] PCOM processing completed successfully")
 
@@ -451,6 +491,7 @@ def process_pcom_files(noleggio_path, soho_path, output_dir, modelli_path, optio
             'processing_log': processing_log
         }
 
+@workbook_cache.operation()
 def process_pcom_with_pobs_realtime(noleggio_path, soho_path, pobs_path, output_dir, modelli_path, options, custom_names=None, session_id=None):
     """
     Process PCOM files with real-time logging and optionally update POBS
@@ -574,6 +615,7 @@ def process_pcom_with_pobs_realtime(noleggio_path, soho_path, pobs_path, output_
             'processing_log': processing_log
         }
 
+@workbook_cache.operation()
 def process_pcom_files_realtime(noleggio_path, soho_path, output_dir, modelli_path, options, custom_name=None, session_id=None):
     """
     Process PCOM files with real-time logging
@@ -603,7 +645,7 @@ def process_pcom_files_realtime(noleggio_path, soho_path, output_dir, modelli_pa
 
         # Load files
         log_message(f"Loading Noleggio file: {os.path.basename(noleggio_path)}")
-        noleggio_data = pd.read_excel(noleggio_path)
+        noleggio_data = workbook_cache.read_excel(noleggio_path, columns=PCOM_NOLEGGIO_COLUMNS)
         log_message(f"Loaded {len(noleggio_data)} records from Noleggio file")
 
         # Apply status filtering for PCOM processing
@@ -615,7 +657,7 @@ def process_pcom_files_realtime(noleggio_path, soho_path, output_dir, modelli_pa
             log_message("[INFO] No records excluded by status filter")
 
         log_message(f"Loading SOHO file: {os.path.basename(soho_path)}")
-        soho_data = pd.read_excel(soho_path)
+        soho_data = workbook_cache.read_excel(soho_path, columns=PCOM_SOHO_COLUMNS)
         log_message(f"Loaded {len(soho_data)} records from SOHO file")
 
         # Load mapping if provided
@@ -683,7 +725,9 @@ def process_pcom_files_realtime(noleggio_path, soho_path, output_dir, modelli_pa
         output_path = os.path.join(pcom_dir, output_filename)
 
         log_message(f"Saving to: {output_filename}")
-        wb_noleggio.save(output_path)
+        save_workbook(wb_noleggio, output_path)
+        file_index.register(output_path)
+        write_preview_sidecar(output_path, wb_noleggio)
         log_message("PCOM file saved successfully")
 
         result_message = f'Successfully processed {records_processed} records'
@@ -722,6 +766,7 @@ def process_pcom_files_realtime(noleggio_path, soho_path, output_dir, modelli_pa
 
         return result
 
+@workbook_cache.operation()
 def process_pobs_update_realtime(pobs_path, noleggio_path, dest_folder, custom_name, session_id=None):
     """
     Update POBS file with new records from Noleggio with real-time logging
@@ -747,12 +792,12 @@ def process_pobs_update_realtime(pobs_path, noleggio_path, dest_folder, custom_n
 
         # Read files
         log_message(f"[INFO] Reading POBS file: {os.path.basename(pobs_path)}")
-        df_pobs = pd.read_excel(pobs_path, dtype=str)
+        df_pobs = workbook_cache.read_excel(pobs_path, dtype=str)
         original_count = len(df_pobs)
         log_message(f"[OK] Loaded {original_count} records from POBS file")
 
         log_message(f"[INFO] Reading Noleggio file: {os.path.basename(noleggio_path)}")
-        df_noleggio = pd.read_excel(noleggio_path, dtype=str)
+        df_noleggio = workbook_cache.read_excel(noleggio_path, dtype=str)
         log_message(f"[OK] Loaded {len(df_noleggio)} records from Noleggio file")
 
         # Apply status filtering for PCOM with POBS processing
@@ -821,7 +866,9 @@ def process_pobs_update_realtime(pobs_path, noleggio_path, dest_folder, custom_n
         output_path = os.path.join(dest_folder, output_filename)
 
         log_message(f"[INFO] Saving updated POBS file: {output_filename}")
-        df_combined.to_excel(output_path, index=False)
+        write_frame(df_combined, output_path)
+        file_index.register(output_path)
+        write_preview_sidecar(output_path, df_combined)
 
         log_message(f"[OK] Successfully added {records_added} records")
         log_message(f"[OK] Final POBS file has {final_count} records")
@@ -11,6 +11,24 @@ from openpyxl import load_workbook
 from openpyxl.styles import numbers
 from .logger_service import log_pobs_operation
 from .realtime_logger import realtime_logger
+from .workbook_cache import workbook_cache
+from .excel_io import read_headers, source_positions
+from .excel_writer import ColumnFormats, save_workbook, write_frame
+from .file_index import file_index
+from .preview_service import write_preview_sidecar
+
+# Number formats of the cells written into POBS and IMEI HUB workbooks
+IMEI_FORMATS = {'imei': numbers.FORMAT_NUMBER, 'date': "DD/MM/YYYY"}
+
+def is_status_column(header):
+    """Header predicate for the columns checked by filter_resolved_rejected_status"""
+    return isinstance(header, str) and header.upper() in ['STATO', 'STATUS']
+
+# Columns read from the Noleggio export: POBS ID key, status columns
+# and A-J + M-X used for the preview and the POBS column mapping
+NOLEGGIO_COLUMNS = ["POBS ID", is_status_column] + list(range(0, 10)) + list(range(12, 24))
+# Only the key is needed from the POBS file when comparing IDs
+POBS_KEY_COLUMNS = ["POBS ID"]
 
 def filter_resolved_rejected_status(df, log_function=None):
     """
@@ -54,6 +72,7 @@ def filter_resolved_rejected_status(df, log_function=None):
 
     return filtered_df, excluded_count
 
+@workbook_cache.operation()
 def verify_new_records(noleggio_path, pobs_path):
     """
     Verify new records between Noleggio and POBS files
@@ -67,7 +86,8 @@ def verify_new_records(noleggio_path, pobs_path):
 
         # Read files
         processing_log.append(f"[INFO] Reading Noleggio file: {os.path.basename(noleggio_path)}")
-        df_noleggio = pd.read_excel(noleggio_path, dtype=str)
+        df_noleggio = workbook_cache.read_excel(noleggio_path, columns=NOLEGGIO_COLUMNS, dtype=str)
+        noleggio_positions = dict(zip(source_positions(df_noleggio), df_noleggio.columns))
         processing_log.append(f"[OK] Loaded {len(df_noleggio)} records from Noleggio file")
 
         # Apply status filtering for POBS verification
@@ -79,7 +99,7 @@ def verify_new_records(noleggio_path, pobs_path):
             processing_log.append("[INFO] No records excluded by status filter")
 
         processing_log.append(f"[INFO] Reading POBS file: {os.path.basename(pobs_path)}")
-        df_pobs = pd.read_excel(pobs_path, dtype=str)
+        df_pobs = workbook_cache.read_excel(pobs_path, columns=POBS_KEY_COLUMNS, dtype=str)
         processing_log.append(f"[OK] Loaded {len(df_pobs)} records from POBS file")
 
 
@@ -89,7 +109,7 @@ def verify_new_records(noleggio_path, pobs_path):
             processing_log.append(f"[ERROR] Column '{chiave}' not found in Noleggio file")
             return {
                 'success': False,
-                'error': f"Column '{chiave}' not found in Noleggio file. Available columns: {list(df_noleggio.columns)}",
+                'error': f"Column '{chiave}' not found in Noleggio file. Available columns: {read_headers(noleggio_path)}",
                 'processing_log': processing_log
             }
 
@@ -97,7 +117,7 @@ def verify_new_records(noleggio_path, pobs_path):
             processing_log.append(f"[ERROR] Column '{chiave}' not found in POBS file")
             return {
                 'success': False,
-                'error': f"Column '{chiave}' not found in POBS file. Available columns: {list(df_pobs.columns)}",
+                'error': f"Column '{chiave}' not found in POBS file. Available columns: {read_headers(pobs_path)}",
                 'processing_log': processing_log
             }
 
@@ -134,23 +154,20 @@ def verify_new_records(noleggio_path, pobs_path):
         # Get preview columns (A-J + M-X)
         processing_log.append("[INFO] Preparing preview data...")
         col_indices = list(range(0, 10)) + list(range(12, 24))
-        anteprima_cols = [nuovi.columns[i] for i in col_indices if i < len(nuovi.columns)]
+        anteprima_cols = [noleggio_positions[i] for i in col_indices if i in noleggio_positions]
         processing_log.append(f"[INFO] Using {len(anteprima_cols)} columns for preview")
 
         # Prepare preview data
         preview_data = []
         for _, row in nuovi.head(50).iterrows():  # First 50 records for preview
             record = {}
-            for i, col_name in enumerate(anteprima_cols):
-                if i < len(col_indices) and col_indices[i] < len(row):
-                    value = row.iloc[col_indices[i]]
-                    # Convert NaN and None to null for JSON serialization
-                    if pd.isna(value) or value is None:
-                        record[col_name] = None
-                    else:
-                        record[col_name] = value
-                else:
+            for col_name in anteprima_cols:
+                value = row[col_name]
+                # Convert NaN and None to null for JSON serialization
+                if pd.isna(value) or value is None:
                     record[col_name] = None
+                else:
+                    record[col_name] = value
             preview_data.append(record)
 
         # Log the verification operation
@@ -207,6 +224,7 @@ def verify_new_records(noleggio_path, pobs_path):
             'processing_log': processing_log
         }
 
+@workbook_cache.operation()
 def verify_new_records_realtime(noleggio_path, pobs_path, session_id=None):
     """
     Verify new records between Noleggio and POBS files with real-time logging
@@ -233,7 +251,8 @@ def verify_new_records_realtime(noleggio_path, pobs_path, session_id=None):
 
         # Read files
         log_message(f"[INFO] Reading Noleggio file: {os.path.basename(noleggio_path)}")
-        df_noleggio = pd.read_excel(noleggio_path, dtype=str)
+        df_noleggio = workbook_cache.read_excel(noleggio_path, columns=NOLEGGIO_COLUMNS, dtype=str)
+        noleggio_positions = dict(zip(source_positions(df_noleggio), df_noleggio.columns))
         log_message(f"[OK] Loaded {len(df_noleggio)} records from Noleggio file")
 
         # Apply status filtering for realtime POBS verification
@@ -245,7 +264,7 @@ def verify_new_records_realtime(noleggio_path, pobs_path, session_id=None):
             log_message("[INFO] No records excluded by status filter")
 
         log_message(f"[INFO] Reading POBS file: {os.path.basename(pobs_path)}")
-        df_pobs = pd.read_excel(pobs_path, dtype=str)
+        df_pobs = workbook_cache.read_excel(pobs_path, columns=POBS_KEY_COLUMNS, dtype=str)
         log_message(f"[OK] Loaded {len(df_pobs)} records from POBS file")
 
         # Check if required column exists
@@ -256,7 +275,7 @@ def verify_new_records_realtime(noleggio_path, pobs_path, session_id=None):
                 realtime_logger.complete_session(session_id)
             return {
                 'success': False,
-                'error': f"Column '{chiave}' not found in Noleggio file. Available columns: {list(df_noleggio.columns)}",
+                'error': f"Column '{chiave}' not found in Noleggio file. Available columns: {read_headers(noleggio_path)}",
                 'processing_log': processing_log
             }
 
@@ -266,7 +285,7 @@ def verify_new_records_realtime(noleggio_path, pobs_path, session_id=None):
                 realtime_logger.complete_session(session_id)
             return {
                 'success': False,
-                'error': f"Column '{chiave}' not found in POBS file. Available columns: {list(df_pobs.columns)}",
+                'error': f"Column '{chiave}' not found in POBS file. Available columns: {read_headers(pobs_path)}",
                 'processing_log': processing_log
             }
 
@@ -306,23 +325,20 @@ def verify_new_records_realtime(noleggio_path, pobs_path, session_id=None):
         # Get preview columns (A-J + M-X)
         log_message("[INFO] Preparing preview data...")
         col_indices = list(range(0, 10)) + list(range(12, 24))
-        anteprima_cols = [nuovi.columns[i] for i in col_indices if i < len(nuovi.columns)]
+        anteprima_cols = [noleggio_positions[i] for i in col_indices if i in noleggio_positions]
         log_message(f"[INFO] Using {len(anteprima_cols)} columns for preview")
 
         # Prepare preview data
         preview_data = []
         for _, row in nuovi.head(50).iterrows():  # First 50 records for preview
             record = {}
-            for i, col_name in enumerate(anteprima_cols):
-                if i < len(col_indices) and col_indices[i] < len(row):
-                    value = row.iloc[col_indices[i]]
-                    # Convert NaN and None to null for JSON serialization
-                    if pd.isna(value) or value is None:
-                        record[col_name] = None
-                    else:
-                        record[col_name] = value
-                else:
+            for col_name in anteprima_cols:
+                value = row[col_name]
+                # Convert NaN and None to null for JSON serialization
+                if pd.isna(value) or value is None:
                     record[col_name] = None
+                else:
+                    record[col_name] = value
             preview_data.append(record)
 
         # Log the verification operation
@@ -390,6 +406,7 @@ def verify_new_records_realtime(noleggio_path, pobs_path, session_id=None):
 
         return result
 
+@workbook_cache.operation()
 def add_new_records_realtime(noleggio_path, pobs_path, session_id=None):
     """
     Add new records to POBS file with real-time logging
@@ -449,11 +466,11 @@ def add_new_records_realtime(noleggio_path, pobs_path, session_id=None):
 
         # Read files to get actual new records
         log_message("[INFO] Reading Noleggio file...")
-        df_noleggio = pd.read_excel(noleggio_path, dtype=str)
+        df_noleggio = workbook_cache.read_excel(noleggio_path, dtype=str)
         log_message(f"[OK] Loaded {len(df_noleggio)} records from Noleggio file")
 
         log_message("[INFO] Reading POBS file...")
-        df_pobs = pd.read_excel(pobs_path, dtype=str)
+        df_pobs = workbook_cache.read_excel(pobs_path, dtype=str)
         original_count = len(df_pobs)
         log_message(f"[OK] Original POBS file has {original_count} records")
 
@@ -478,7 +495,9 @@ def add_new_records_realtime(noleggio_path, pobs_path, session_id=None):
         output_path = os.path.join(pobs_dir, output_filename)
 
         log_message("[INFO] Saving updated POBS file...")
-        df_combined.to_excel(output_path, index=False)
+        write_frame(df_combined, output_path)
+        file_index.register(output_path)
+        write_preview_sidecar(output_path, df_combined)
 
         final_count = len(df_combined)
         records_added = len(nuovi)
@@ -515,6 +534,7 @@ def add_new_records_realtime(noleggio_path, pobs_path, session_id=None):
             realtime_logger.complete_session(session_id)
         return result
 
+@workbook_cache.operation()
 def add_new_records(noleggio_path, pobs_path, output_dir):
     """
     Add new records to POBS file
@@ -549,8 +569,8 @@ def add_new_records(noleggio_path, pobs_path, output_dir):
                 'message': message,
                 'records_added': 0,
                 'excluded_resolved_rejected_count': excluded_count,
-                'total_noleggio_records': len(pd.read_excel(noleggio_path, dtype=str)),
-                'total_pobs_records': len(pd.read_excel(pobs_path, dtype=str)),
+                'total_noleggio_records': len(workbook_cache.read_excel(noleggio_path, columns=NOLEGGIO_COLUMNS, dtype=str)),
+                'total_pobs_records': len(workbook_cache.read_excel(pobs_path, columns=POBS_KEY_COLUMNS, dtype=str)),
                 'processing_log': processing_log
             }
 
@@ -559,8 +579,9 @@ def add_new_records(noleggio_path, pobs_path, output_dir):
         # Re-read files for processing
         processing_log.append("[INFO] Reading files for processing...")
         chiave = "POBS ID"
-        df_noleggio = pd.read_excel(noleggio_path, dtype=str)
-        df_pobs = pd.read_excel(pobs_path, dtype=str)
+        df_noleggio = workbook_cache.read_excel(noleggio_path, columns=NOLEGGIO_COLUMNS, dtype=str)
+        df_pobs = workbook_cache.read_excel(pobs_path, columns=POBS_KEY_COLUMNS, dtype=str)
+        noleggio_columns = dict(zip(source_positions(df_noleggio), df_noleggio.columns))
 
         processing_log.append("[INFO] Cleaning and normalizing data...")
         df_noleggio[chiave] = df_noleggio[chiave].astype(str).str.strip().str.upper()
@@ -576,6 +597,7 @@ def add_new_records(noleggio_path, pobs_path, output_dir):
         backup_filename = f"{os.path.splitext(os.path.basename(pobs_path))[0]}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         backup_file = os.path.join(cartella_backup, backup_filename)
         shutil.copy2(pobs_path, backup_file)
+        file_index.register(backup_file)
         processing_log.append(f"[OK] Backup created: {backup_filename}")
 
         # Load workbook for modification
@@ -596,24 +618,21 @@ def add_new_records(noleggio_path, pobs_path, output_dir):
             20: 18, 21: 19, 23: 20           # M→U
         }
 
-        processing_log.append("[INFO] Adding new records to POBS file...")
-        nuovi_id = []
-        records_processed = 0
-        for _, row in nuovi.iterrows():
-            records_processed += 1
-            if records_processed % 10 == 0:
-                processing_log.append(f"[INFO] Processed {records_processed}/{len(nuovi)} records...")
-            nuova_riga = [None] * tot_colonne
-            for col_noleggio, col_pobs in mappa.items():
-                if col_noleggio < len(row):
-                    nuova_riga[col_pobs] = row.iloc[col_noleggio]
-
-            # Column Y (index 24) = "IN GESTIONE"
-            if 24 < tot_colonne:
-                nuova_riga[24] = "IN GESTIONE"
+        processing_log.append(f"[INFO] Adding {len(nuovi)} new records to POBS file...")
+        nuovi_id = nuovi[chiave].tolist()
+
+        # Project the Noleggio columns onto the POBS layout column by column
+        colonne = [[None] * len(nuovi) for _ in range(tot_colonne)]
+        for col_noleggio, col_pobs in mappa.items():
+            if col_noleggio in noleggio_columns and col_pobs < tot_colonne:
+                colonne[col_pobs] = nuovi[noleggio_columns[col_noleggio]].tolist()
+
+        # Column Y (index 24) = "IN GESTIONE"
+        if 24 < tot_colonne:
+            colonne[24] = ["IN GESTIONE"] * len(nuovi)
 
+        for nuova_riga in zip(*colonne):
             ws.append(nuova_riga)
-            nuovi_id.append(row[chiave])
 
         processing_log.append(f"[OK] Successfully added {len(nuovi_id)} records to worksheet")
 
@@ -626,7 +645,9 @@ def add_new_records(noleggio_path, pobs_path, output_dir):
         processing_log.append("[INFO] Saving updated POBS file...")
         updated_filename = f"{os.path.splitext(os.path.basename(pobs_path))[0]}_updated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         updated_file = os.path.join(pobs_dir, updated_filename)
-        wb.save(updated_file)
+        save_workbook(wb, updated_file)
+        file_index.register(updated_file)
+        write_preview_sidecar(updated_file, wb)
         processing_log.append(f"[OK] Updated file saved: {updated_filename}")
 
         # Create log
@@ -695,6 +716,58 @@ def add_new_records(noleggio_path, pobs_path, output_dir):
             'processing_log': processing_log
         }
 
+def merge_imei_rows(df_pobs, pobs_imei_col, df_master, master_imei_col, df_template):
+    """
+    Fill the template with the master rows of the POBS IMEIs, in POBS order
+
+    Row N of the result gets the master columns shared with the template for
+    the N-th POBS IMEI found in the master (last master row wins on duplicate
+    IMEIs); the template grows when there are more matches than rows.
+
+    Returns:
+        (result frame, matched records, empty string cells copied)
+    """
+    # IMEI -> master row, keeping the last occurrence like a dict would.
+    # Missing IMEIs never match: astype(str) keeps them as NaN, which
+    # isin/reindex would otherwise pair with each other.
+    master_keys = df_master[master_imei_col].dropna().astype(str)
+    master_rows = pd.Series(master_keys.index, index=master_keys.to_numpy())
+    master_rows = master_rows[~master_rows.index.duplicated(keep='last')]
+
+    pobs_keys = df_pobs[pobs_imei_col].dropna().astype(str)
+    matched = master_rows.reindex(pobs_keys[pobs_keys.isin(master_rows.index)])
+    updated_count = len(matched)
+
+    common_cols = [col for col in df_master.columns if col in df_template.columns]
+    updates = df_master.loc[matched.values, common_cols].reset_index(drop=True)
+
+    # Count None, empty and blank string cells among the copied values
+    empty_cell_count = 0
+    for col in common_cols:
+        values = updates[col]
+        empty_cell_count += int((values.to_numpy(dtype=object) == None).sum())  # noqa: E711
+        if not pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_datetime64_any_dtype(values):
+            try:
+                empty_cell_count += int(values.str.strip().eq('').fillna(False).sum())
+            except AttributeError:
+                pass  # No string values in this column
+
+    df_result = df_template.copy()
+    if updated_count == 0:
+        return df_result, 0, 0
+    if updated_count > len(df_result):
+        df_result = df_result.reindex(range(updated_count))
+
+    for col in common_cols:
+        values = updates[col]
+        if df_result[col].dtype == object:
+            # Template columns stay object, as with cell-by-cell assignment
+            values = values.astype(object)
+        tail = df_result[col].iloc[updated_count:]
+        df_result[col] = pd.concat([values, tail], ignore_index=True) if len(tail) else values
+    return df_result, updated_count, empty_cell_count
+
+@workbook_cache.operation()
 def update_imei_data_realtime(pobs_path, master_path, template_path, session_id=None, custom_name=None):
     """
     Update IMEI data from masterfile with real-time logging
@@ -720,15 +793,15 @@ def update_imei_data_realtime(pobs_path, master_path, template_path, session_id=
 
         # Read files
         log_message("[INFO] Reading POBS file...")
-        df_pobs = pd.read_excel(pobs_path)
+        df_pobs = workbook_cache.read_excel(pobs_path)
         log_message(f"[OK] POBS file loaded with {len(df_pobs)} records")
 
         log_message("[INFO] Reading master file...")
-        df_master = pd.read_excel(master_path)
+        df_master = workbook_cache.read_excel(master_path)
         log_message(f"[OK] Master file loaded with {len(df_master)} records")
 
         log_message("[INFO] Reading template file...")
-        df_template = pd.read_excel(template_path)
+        df_template = workbook_cache.read_excel(template_path)
         log_message(f"[OK] Template file loaded with {len(df_template)} records")
 
         # Check if IMEI columns exist
@@ -772,25 +845,9 @@ def update_imei_data_realtime(pobs_path, master_path, template_path, session_id=
         df_result = df_template.copy()
         template_warnings = []
 
-        # Create a mapping from master file
-        master_mapping = dict(zip(df_master[master_imei_col].astype(str), df_master.index))
-
-        updated_count = 0
-        empty_cell_count = 0
-
-        for idx, row in df_pobs.iterrows():
-            imei_value = str(row[pobs_imei_col])
-            if imei_value in master_mapping:
-                master_idx = master_mapping[imei_value]
-                # Copy data from master to result and check for empty cells
-                for col in df_master.columns:
-                    if col in df_result.columns:
-                        value = df_master.loc[master_idx, col]
-                        df_result.loc[updated_count, col] = value
-                        # Check for empty cells
-                        if value is None or value == '' or (isinstance(value, str) and value.strip() == ''):
-                            empty_cell_count += 1
-                updated_count += 1
+        df_result, updated_count, empty_cell_count = merge_imei_rows(
+            df_pobs, pobs_imei_col, df_master, master_imei_col, df_result
+        )
 
         # Add warning if empty cells found
         if empty_cell_count > 0:
@@ -813,7 +870,9 @@ def update_imei_data_realtime(pobs_path, master_path, template_path, session_id=
         # Save updated file
         output_path = os.path.join(imei_hub_dir, output_filename)
         log_message("[INFO] Saving updated file...")
-        df_result.to_excel(output_path, index=False)
+        write_frame(df_result, output_path)
+        file_index.register(output_path)
+        write_preview_sidecar(output_path, df_result)
         log_message(f"[OK] Updated file saved: {output_filename}")
 
         result_message = f'Successfully updated {updated_count} IMEI records'
@@ -848,6 +907,7 @@ def update_imei_data_realtime(pobs_path, master_path, template_path, session_id=
             realtime_logger.complete_session(session_id)
         return result
 
+@workbook_cache.operation()
 def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_name=None):
     """
     Update IMEI data from masterfile with enhanced formatting and custom naming
@@ -865,12 +925,13 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
         backup_filename = f"{os.path.splitext(os.path.basename(pobs_path))[0]}_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         backup_file = os.path.join(cartella_backup, backup_filename)
         shutil.copy2(pobs_path, backup_file)
+        file_index.register(backup_file)
         processing_log.append(f"[OK] Backup created: {backup_filename}")
 
         # Load masterfile "PER STOPRIPARO" sheet
         processing_log.append(f"[INFO] Loading master file: {os.path.basename(master_path)}")
-        df_master = pd.read_excel(master_path, dtype=str, sheet_name="PER STOPRIPARO")
-        df_master = df_master.iloc[:, [1, 2, 7]]  # B=GUID, C=IMEI, H=Data spedizione
+        # B=GUID, C=IMEI, H=Data spedizione
+        df_master = workbook_cache.read_excel(master_path, columns=[1, 2, 7], dtype=str, sheet_name="PER STOPRIPARO")
         df_master.columns = ["GUID", "IMEI", "DATA_SPED"]
         df_master["GUID"] = df_master["GUID"].astype(str).str.strip().str.upper()
         processing_log.append(f"[OK] Loaded {len(df_master)} records from master file")
@@ -883,6 +944,7 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
         processing_log.append(f"[INFO] Loading POBS workbook: {os.path.basename(pobs_path)}")
         wb = load_workbook(pobs_path)
         ws = wb.active
+        formats = ColumnFormats(wb, IMEI_FORMATS)
         processing_log.append("[OK] POBS workbook loaded successfully")
 
         # Column indices (same as original)
@@ -895,6 +957,9 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
         aggiornati_id = []
         righe_template = []
         data_sped_finale = None
+        # Rows whose IMEI / date cells get a number format, applied once at the end
+        imei_rows = []
+        date_rows = []
 
         processing_log.append("[INFO] Starting IMEI data updates...")
         total_rows = ws.max_row - 1  # Excluding header
@@ -913,8 +978,8 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
                 if imei_val and imei_val.strip():
                     try:
                         imei_num = int(imei_val)
-                        cell_imei = ws.cell(row=row[0].row, column=col_imei, value=imei_num)
-                        cell_imei.number_format = numbers.FORMAT_NUMBER
+                        ws.cell(row=row[0].row, column=col_imei, value=imei_num)
+                        imei_rows.append(row[0].row)
                     except:
                         ws.cell(row=row[0].row, column=col_imei, value=imei_val)
 
@@ -923,8 +988,8 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
                     try:
                         data_conv = pd.to_datetime(data_sped, errors="coerce", dayfirst=True)
                         if pd.notnull(data_conv):
-                            cell_data = ws.cell(row=row[0].row, column=col_data, value=data_conv)
-                            cell_data.number_format = "DD/MM/YYYY"
+                            ws.cell(row=row[0].row, column=col_data, value=data_conv)
+                            date_rows.append(row[0].row)
                         else:
                             ws.cell(row=row[0].row, column=col_data, value=data_sped)
                     except:
@@ -942,20 +1007,22 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
                 if not data_sped_finale and data_sped:
                     data_sped_finale = data_sped
 
+        formats.format_rows(ws, col_imei, imei_rows, 'imei')
+        formats.format_rows(ws, col_data, date_rows, 'date')
         processing_log.append(f"[OK] Updated {aggiornati} records with IMEI data")
 
         # Save updated POBS file and create downloadable copy
         processing_log.append("[INFO] Saving updated POBS file...")
-        wb.save(pobs_path)
-        processing_log.append("[OK] Original POBS file updated and saved")
-
-        # Create downloadable copy of updated POBS file
         pobs_output_dir = os.path.join(output_dir, "POBS")
         os.makedirs(pobs_output_dir, exist_ok=True)
 
         pobs_updated_filename = f"{os.path.splitext(os.path.basename(pobs_path))[0]}_updated_with_IMEI_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         pobs_updated_path = os.path.join(pobs_output_dir, pobs_updated_filename)
-        wb.save(pobs_updated_path)
+        # Serialized once; the downloadable copy is linked or copied from it
+        save_workbook(wb, pobs_path, [pobs_updated_path])
+        processing_log.append("[OK] Original POBS file updated and saved")
+        file_index.register(pobs_updated_path)
+        write_preview_sidecar(pobs_updated_path, wb)
         processing_log.append(f"[OK] Updated POBS file saved for download: {pobs_updated_filename}")
 
         # Generate IMEI HUB file if there are updated records
@@ -965,17 +1032,19 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
             processing_log.append(f"[INFO] Generating IMEI HUB file for {len(righe_template)} updated records...")
             wb_template = load_workbook(template_path)
             ws_template = wb_template.active
+            template_formats = ColumnFormats(wb_template, IMEI_FORMATS)
+            template_imei_rows = []
 
             # Check for empty cells in template columns and add warning
             empty_cell_count = 0
             for valori in righe_template:
                 ws_template.append(valori)
-                # Format IMEI column (column 10) as number
+                # IMEI column (column 10) as number
                 last_row = ws_template.max_row
                 imei_cell = ws_template.cell(row=last_row, column=10)
                 try:
                     imei_cell.value = int(imei_cell.value)
-                    imei_cell.number_format = numbers.FORMAT_NUMBER
+                    template_imei_rows.append(last_row)
                 except:
                     pass
 
@@ -984,6 +1053,8 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
                     if val is None or val == '' or (isinstance(val, str) and val.strip() == ''):
                         empty_cell_count += 1
 
+            template_formats.format_rows(ws_template, 10, template_imei_rows, 'imei')
+
             if empty_cell_count > 0:
                 warning_msg = f"⚠️ Warning: Found {empty_cell_count} empty cells in template columns. Please review the output file for missing data."
                 processing_log.append(f"[WARNING] {warning_msg}")
@@ -1000,7 +1071,9 @@ def update_imei_data(pobs_path, master_path, template_path, output_dir, custom_n
                 imei_hub_filename = f"IMEI_HUB_{datetime.now().strftime('%Y%m%d')}.xlsx"
 
             imei_hub_path = os.path.join(imei_hub_dir, imei_hub_filename)
-            wb_template.save(imei_hub_path)
+            save_workbook(wb_template, imei_hub_path)
+            file_index.register(imei_hub_path)
+            write_preview_sidecar(imei_hub_path, wb_template)
             processing_log.append(f"[OK] IMEI HUB file saved: {imei_hub_filename}")
         else:
             processing_log.append("[INFO] No records updated - IMEI HUB file not generated")
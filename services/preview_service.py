@@ -0,0 +1,358 @@
+"""
+Preview Service
+Windowed previews of output files: only the requested rows (and columns)
+are decoded, the row count comes from sheet metadata when available.
+Writers also leave a gzip JSON sidecar with the header, the first rows and
+the row count, so repeated previews do not open the workbook at all.
+"""
+
+import csv
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+from itertools import islice
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import xlrd
+
+from .excel_io import cell_text, open_readonly_workbook, resolve_columns
+
+MAX_LIMIT = 1000
+
+# Sidecars live in a hidden folder next to the output (ignored by the file index)
+SIDECAR_DIR = '.previews'
+SIDECAR_ROWS = int(os.getenv('PREVIEW_SIDECAR_ROWS', '100'))
+SIDECAR_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+_ROW_TAG = re.compile(rb'<row [^>]*?r="(\d+)"')
+
+
+class _RowCounts:
+    """Row counts computed by a full scan, keyed by path, size and mtime"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries: Dict[str, Tuple[int, int, int]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[int]:
+        stat = os.stat(path)
+        with self.lock:
+            known = self.entries.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        return None
+
+    def put(self, path: str, count: int):
+        stat = os.stat(path)
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[path] = (stat.st_size, stat.st_mtime_ns, count)
+
+
+row_counts = _RowCounts()
+
+
+def _column_names(headers: Sequence[object]) -> List[str]:
+    """Header names as pandas would label them (blank and duplicate headers)"""
+    names = []
+    seen: Dict[str, int] = {}
+    for i, header in enumerate(headers):
+        name = cell_text(header) if header is not None and header != '' else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _window(names: List[str], rows, positions: Optional[List[int]]) -> Tuple[List[str], List[dict]]:
+    """Project rows on the selected positions and key them by column name"""
+    if positions is None:
+        positions = list(range(len(names)))
+    columns = [names[i] for i in positions]
+    records = []
+    for row in rows:
+        records.append({name: cell_text(row[i]) if i < len(row) else '' for name, i in zip(columns, positions)})
+    return columns, records
+
+
+def _scan_last_row(wb, ws, chunk_size: int = 1024 * 1024) -> int:
+    """Number of the last <row> of a sheet, found in the raw XML without parsing cells"""
+    last = 0
+    tail = b''
+    with wb._archive.open(ws._worksheet_path) as source:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            data = tail + chunk
+            for match in _ROW_TAG.finditer(data):
+                last = int(match.group(1))
+            # Keep a partial tag that straddles two chunks
+            tail = data[-256:]
+    return last
+
+
+def _names_and_positions(headers: List[object], columns: Optional[Sequence[str]]) -> Tuple[List[str], Optional[List[int]]]:
+    while headers and (headers[-1] is None or headers[-1] == ''):
+        headers.pop()
+    names = _column_names(headers)
+    if not columns:
+        return names, None
+    return names, [i for i in resolve_columns(names, columns) if i < len(names)]
+
+
+def _preview_xlsx(path: str, offset: int, limit: int, columns: Optional[Sequence[str]]) -> dict:
+    # Only rows up to the end of the window are parsed. calamine is not used
+    # here: it decodes the whole sheet as soon as the sheet is opened.
+    with open_readonly_workbook(path) as wb:
+        ws = wb.worksheets[0]
+        # The <dimension> element gives the row count without parsing rows;
+        # some exporters omit it, then the row tags are scanned once and cached
+        total = None
+        if ws.max_row is not None:
+            total = max(ws.max_row - 1, 0)
+            total_source = 'dimension'
+        else:
+            total_source = 'scan'
+
+        headers = []
+        for row in ws.iter_rows(max_row=1, values_only=True):
+            headers = list(row)
+        names, positions = _names_and_positions(headers, columns)
+        if positions is None:
+            max_col = len(names) or None
+        else:
+            max_col = positions[-1] + 1 if positions else 1
+
+        rows = list(ws.iter_rows(min_row=2 + offset, max_row=1 + offset + limit,
+                                 max_col=max_col, values_only=True)) if limit else []
+
+        # A dimension smaller than the rows just read is stale
+        if total is not None and total < offset + len(rows):
+            total = None
+            total_source = 'scan'
+        if total is None:
+            total = row_counts.get(path)
+        if total is None:
+            total = max(_scan_last_row(wb, ws) - 1, 0)
+            row_counts.put(path, total)
+
+    # Blank rows past the data are not part of the preview
+    while rows and all(value is None for value in rows[-1]):
+        rows.pop()
+    columns_out, records = _window(names, rows, positions)
+    return {'columns': columns_out, 'all_columns': names, 'rows': records,
+            'total_rows': total, 'total_rows_source': total_source, 'reader_engine': 'openpyxl (read-only)'}
+
+
+def _preview_xls(path: str, offset: int, limit: int, columns: Optional[Sequence[str]]) -> dict:
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        names, positions = _names_and_positions(sheet.row_values(0) if sheet.nrows else [], columns)
+        end = min(sheet.nrows, 1 + offset + limit)
+        rows = []
+        for index in range(1 + offset, end):
+            values = []
+            for cell in sheet.row(index):
+                if cell.ctype == xlrd.XL_CELL_DATE:
+                    values.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+                elif cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+                    values.append(None)
+                else:
+                    values.append(cell.value)
+            rows.append(values)
+        total = max(sheet.nrows - 1, 0)
+    finally:
+        book.release_resources()
+    columns_out, records = _window(names, rows, positions)
+    return {'columns': columns_out, 'all_columns': names, 'rows': records,
+            'total_rows': total, 'total_rows_source': 'dimension', 'reader_engine': 'xlrd'}
+
+
+def _preview_csv(path: str, offset: int, limit: int, columns: Optional[Sequence[str]]) -> dict:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        names, positions = _names_and_positions(next(reader, []), columns)
+        rows = [[value if value != '' else None for value in row]
+                for row in islice(reader, offset, offset + limit)]
+
+    total = row_counts.get(path)
+    if total is None:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            total = max(sum(1 for _ in csv.reader(f)) - 1, 0)
+        row_counts.put(path, total)
+    columns_out, records = _window(names, rows, positions)
+    return {'columns': columns_out, 'all_columns': names, 'rows': records,
+            'total_rows': total, 'total_rows_source': 'scan', 'reader_engine': 'csv'}
+
+
+def _read_preview(path: str, offset: int, limit: int, columns: Optional[Sequence[str]]) -> dict:
+    """Decode a window of the file itself"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        return _preview_xlsx(path, offset, limit, columns)
+    if ext == '.xls':
+        return _preview_xls(path, offset, limit, columns)
+    if ext == '.csv':
+        return _preview_csv(path, offset, limit, columns)
+    raise ValueError('File type not supported for preview')
+
+
+# ============================================================================
+# Sidecars
+# ============================================================================
+
+def sidecar_path(path: str) -> str:
+    """Where the preview sidecar of an output file is stored"""
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, SIDECAR_DIR, f"{filename}.json.gz")
+
+
+def _workbook_sidecar(wb) -> Tuple[List[str], List[List[str]], int]:
+    """Header, first rows and row count of an in-memory openpyxl workbook"""
+    ws = wb.worksheets[0]
+    headers = [cell.value for cell in next(ws.iter_rows(max_row=1), ())]
+    names, _ = _names_and_positions(headers, None)
+    rows = []
+    for row in ws.iter_rows(min_row=2, max_row=SIDECAR_ROWS + 1, max_col=len(names) or 1, values_only=True):
+        # Formulas have no cached value until Excel recalculates the file
+        rows.append([None if isinstance(value, str) and value.startswith('=') else value for value in row])
+    # Template sheets keep formatted but empty rows below the data
+    last_row = ws.max_row
+    while last_row > 1 and all(cell.value is None for cell in ws[last_row]):
+        last_row -= 1
+    rows = rows[:last_row - 1]
+    total = last_row - 1
+    return names, [[cell_text(value) for value in row] for row in rows], total
+
+
+def _frame_sidecar(df) -> Tuple[List[str], List[List[str]], int]:
+    """Header, first rows and row count of a DataFrame written with index=False"""
+    names = _column_names(list(df.columns))
+    rows = [[cell_text(value) for value in row] for row in df.head(SIDECAR_ROWS).itertuples(index=False, name=None)]
+    return names, rows, len(df)
+
+
+def _file_sidecar(path: str) -> Tuple[List[str], List[List[str]], int]:
+    """Header, first rows and row count decoded from the file"""
+    preview = _read_preview(path, 0, SIDECAR_ROWS, None)
+    names = preview['all_columns']
+    return names, [[record[name] for name in names] for record in preview['rows']], preview['total_rows']
+
+
+def write_preview_sidecar(path: str, source=None) -> Optional[dict]:
+    """
+    Store the preview sidecar of an output file
+
+    Args:
+        path: The file just written
+        source: The DataFrame or openpyxl Workbook that was saved, so the
+            sidecar is built from memory; None decodes the file
+
+    Returns:
+        The sidecar, or None if it could not be built (never raises: a
+        missing sidecar only means previews parse the file)
+    """
+    try:
+        if source is None:
+            names, rows, total = _file_sidecar(path)
+        elif hasattr(source, 'worksheets'):
+            names, rows, total = _workbook_sidecar(source)
+        else:
+            names, rows, total = _frame_sidecar(source)
+
+        stat = os.stat(path)
+        meta = {'version': SIDECAR_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'columns': names, 'total_rows': total}
+        target = sidecar_path(path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            # Metadata on its own line so listings can read it without the rows
+            f.write(json.dumps(meta, ensure_ascii=False) + '\n')
+            f.write(json.dumps(rows, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, target)
+        meta['rows'] = rows
+        return meta
+    except Exception as e:
+        logger.warning("Preview sidecar not written for %s: %s", os.path.basename(path), e)
+        return None
+
+
+def read_preview_sidecar(path: str, with_rows: bool = True) -> Optional[dict]:
+    """The sidecar of a file, or None when missing or stale (size/mtime changed)"""
+    try:
+        stat = os.stat(path)
+        with gzip.open(sidecar_path(path), 'rt', encoding='utf-8') as f:
+            meta = json.loads(f.readline())
+            if (meta.get('version') != SIDECAR_VERSION or meta['size'] != stat.st_size
+                    or meta['mtime_ns'] != stat.st_mtime_ns):
+                return None
+            if with_rows:
+                meta['rows'] = json.loads(f.readline())
+        return meta
+    except (OSError, ValueError, KeyError, EOFError):
+        return None
+
+
+def remove_preview_sidecar(path: str):
+    """Drop the sidecar of a deleted file"""
+    try:
+        os.remove(sidecar_path(path))
+    except OSError:
+        pass
+
+
+def _sidecar_preview(sidecar: dict, offset: int, limit: int, columns: Optional[Sequence[str]]) -> dict:
+    names = sidecar['columns']
+    positions = [i for i in resolve_columns(names, columns) if i < len(names)] if columns else list(range(len(names)))
+    selected = [names[i] for i in positions]
+    records = [{name: row[i] if i < len(row) else '' for name, i in zip(selected, positions)}
+               for row in sidecar['rows'][offset:offset + limit]]
+    return {'columns': selected, 'all_columns': names, 'rows': records,
+            'total_rows': sidecar['total_rows'], 'total_rows_source': 'sidecar', 'reader_engine': 'sidecar'}
+
+
+def preview_file(path: str, offset: int = 0, limit: int = 10, columns: Optional[Sequence[str]] = None) -> dict:
+    """
+    Rows offset..offset+limit of the first sheet of a file
+
+    Args:
+        path: .xlsx/.xlsm, .xls or .csv file
+        offset: Data rows to skip (the header row is not counted)
+        limit: Data rows to return, capped at MAX_LIMIT
+        columns: Header names or column letters to return, None for all
+
+    Returns:
+        Dict with columns, all_columns, rows (dicts of text values),
+        total_rows and the source of that count
+
+    Raises:
+        ValueError: unsupported file type
+    """
+    offset = max(offset, 0)
+    limit = min(max(limit, 0), MAX_LIMIT)
+    if os.path.splitext(path)[1].lower() not in ('.xlsx', '.xlsm', '.xls', '.csv'):
+        raise ValueError('File type not supported for preview')
+
+    # Windows within the first SIDECAR_ROWS rows come from the sidecar,
+    # which is built on first use for files written without one
+    sidecar = read_preview_sidecar(path) or write_preview_sidecar(path)
+    if sidecar is not None and (offset + limit <= len(sidecar['rows']) or len(sidecar['rows']) >= sidecar['total_rows']):
+        preview = _sidecar_preview(sidecar, offset, limit, columns)
+    else:
+        preview = _read_preview(path, offset, limit, columns)
+    preview.update({'offset': offset, 'limit': limit,
+                    'has_more': offset + len(preview['rows']) < preview['total_rows']})
+    return preview
@@ -4,43 +4,146 @@ Provides real-time log streaming for long-running operations
 """
 
 import json
+import os
 import threading
 import time
 from flask import Response
-from typing import Dict, List, Callable
+from typing import Callable, Optional
 import uuid
 
+from .log_bus import LogBus, create_log_bus
+
+# Seconds between SSE heartbeat comments on an idle stream
+HEARTBEAT_INTERVAL = float(os.getenv('REALTIME_HEARTBEAT_SECONDS', '15'))
+# Seconds between checks for lines written by other worker processes
+CROSS_PROCESS_POLL = float(os.getenv('REALTIME_POLL_SECONDS', '0.05'))
+
+class SessionChannels:
+    """
+    Per-session wakeup channels behind sharded locks
+
+    Streams wait on their session's condition instead of polling; log()
+    calls notify only that session, and unrelated sessions never contend
+    for the same lock unless they hash to the same shard.
+    """
+
+    def __init__(self, bus: LogBus, shards: int = 16):
+        self.bus = bus
+        self.shards = [(threading.Lock(), {}) for _ in range(shards)]
+        # session_id -> [version, waiters, condition] inside each shard dict
+        self.waiting = 0
+        self.watch_cond = threading.Condition()
+        self.watcher = None
+
+    def _channel(self, session_id: str):
+        lock, channels = self.shards[hash(session_id) % len(self.shards)]
+        with lock:
+            channel = channels.get(session_id)
+            if channel is None:
+                channel = channels[session_id] = [0, 0, threading.Condition(lock)]
+        return lock, channels, channel
+
+    def version(self, session_id: str) -> int:
+        """Counter bumped on every notification of the session"""
+        lock, _, channel = self._channel(session_id)
+        with lock:
+            return channel[0]
+
+    def notify(self, session_id: str):
+        """Wake the streams of one session"""
+        lock, channels = self.shards[hash(session_id) % len(self.shards)]
+        with lock:
+            channel = channels.get(session_id)
+            if channel is not None:
+                channel[0] += 1
+                if channel[1]:
+                    channel[2].notify_all()
+
+    def notify_waiting(self):
+        """Wake every waiting stream (new lines may come from another process)"""
+        for lock, channels in self.shards:
+            with lock:
+                for channel in channels.values():
+                    if channel[1]:
+                        channel[0] += 1
+                        channel[2].notify_all()
+
+    def wait(self, session_id: str, seen_version: int, timeout: float) -> bool:
+        """Wait until the session changes after seen_version; False on timeout"""
+        lock, channels, channel = self._channel(session_id)
+        self._watching(1)
+        try:
+            with lock:
+                channel[1] += 1
+                try:
+                    return channel[2].wait_for(lambda: channel[0] != seen_version, timeout)
+                finally:
+                    channel[1] -= 1
+        finally:
+            self._watching(-1)
+
+    def discard(self, session_id: str):
+        """Forget the channel of a finished session"""
+        lock, channels = self.shards[hash(session_id) % len(self.shards)]
+        with lock:
+            channel = channels.get(session_id)
+            if channel is not None and not channel[1]:
+                del channels[session_id]
+
+    def _watching(self, delta: int):
+        """Track waiting streams and start the cross-process watcher on demand"""
+        if not self.bus.shared:
+            # Single-process backend: in-process notifications are complete
+            return
+        with self.watch_cond:
+            self.waiting += delta
+            if self.waiting and self.watcher is None:
+                self.watcher = threading.Thread(target=self._watch, name='realtime-watcher', daemon=True)
+                self.watcher.start()
+            self.watch_cond.notify_all()
+
+    def _watch(self):
+        """Poll one cheap change token per process while any stream waits"""
+        token = self.bus.change_token()
+        while True:
+            with self.watch_cond:
+                # Idle: sleep until a stream starts waiting
+                self.watch_cond.wait_for(lambda: self.waiting > 0)
+            time.sleep(CROSS_PROCESS_POLL)
+            current = self.bus.change_token()
+            if current != token:
+                token = current
+                self.notify_waiting()
+
 class RealTimeLogger:
-    def __init__(self):
-        # Store active connections and their log queues
-        self.connections: Dict[str, List[str]] = {}
-        # Store final results for each session
-        self.results: Dict[str, dict] = {}
-        self.lock = threading.Lock()
+    def __init__(self, bus: Optional[LogBus] = None):
+        # Session logs and final results live in a backend shared by all workers
+        self.bus = bus or create_log_bus()
+        self.channels = SessionChannels(self.bus)
 
     def create_session(self) -> str:
         """Create a new logging session and return session ID"""
         session_id = str(uuid.uuid4())
-        with self.lock:
-            self.connections[session_id] = []
+        self.bus.purge_expired()
+        self.bus.create_session(session_id)
         return session_id
 
     def log(self, session_id: str, message: str, level: str = "info"):
         """Add a log message to a specific session"""
-        with self.lock:
-            if session_id in self.connections:
-                if level == "info":
-                    self.connections[session_id].append(f"[INFO] {message}")
-                elif level == "success":
-                    self.connections[session_id].append(f"[OK] {message}")
-                elif level == "warning":
-                    self.connections[session_id].append(f"[WARNING] {message}")
-                elif level == "error":
-                    self.connections[session_id].append(f"[ERROR] {message}")
-                elif level == "complete":
-                    self.connections[session_id].append("__COMPLETE__")
-                else:
-                    self.connections[session_id].append(message)
+        if level == "info":
+            line = f"[INFO] {message}"
+        elif level == "success":
+            line = f"[OK] {message}"
+        elif level == "warning":
+            line = f"[WARNING] {message}"
+        elif level == "error":
+            line = f"[ERROR] {message}"
+        elif level == "complete":
+            line = "__COMPLETE__"
+        else:
+            line = message
+        if self.bus.append(session_id, line) is not None:
+            self.channels.notify(session_id)
 
     def log_info(self, session_id: str, message: str):
         """Log an info message"""
@@ -60,47 +163,64 @@ class RealTimeLogger:
 
     def store_result(self, session_id: str, result: dict):
         """Store the final result for a session"""
-        with self.lock:
-            self.results[session_id] = result
+        self.bus.set_result(session_id, result)
 
     def get_result(self, session_id: str) -> dict:
         """Get the final result for a session"""
-        with self.lock:
-            return self.results.get(session_id)
+        return self.bus.get_result(session_id)
 
     def complete_session(self, session_id: str):
-        """Mark a session as complete"""
+        """Mark a session as complete (its log stays replayable until it expires)"""
         self.log(session_id, "", "complete")
+        self.bus.mark_complete(session_id)
 
-    def stream_logs(self, session_id: str):
-        """Generator function to stream logs via SSE"""
-        last_index = 0
-
-        while True:
-            with self.lock:
-                if session_id not in self.connections:
-                    break
-
-                logs = self.connections[session_id]
-                new_logs = logs[last_index:]
-
-                for log in new_logs:
-                    if log == "__COMPLETE__":
-                        # Session completed, clean up and close
-                        del self.connections[session_id]
-                        yield f"data: {json.dumps({'type': 'complete'})}\n\n"
-                        return
-                    else:
-                        yield f"data: {json.dumps({'type': 'log', 'message': log})}\n\n"
+    def stream_logs(self, session_id: str, last_event_id: int = 0):
+        """
+        Generator function to stream logs via SSE
 
-                last_index = len(logs)
+        Every event carries its id; a client reconnecting with Last-Event-ID
+        only receives the events after it.
+        """
+        last_id = last_event_id
 
-            time.sleep(0.1)  # Small delay to prevent busy waiting
-
-    def get_sse_response(self, session_id: str) -> Response:
-        """Get Flask Response object for SSE streaming"""
+        while True:
+            # Read the version first so a line logged meanwhile still wakes us
+            seen_version = self.channels.version(session_id)
+            if not self.bus.session_exists(session_id):
+                self.channels.discard(session_id)
+                break
+
+            # Deliver everything queued since the last wakeup in one chunk
+            chunk = []
+            events = self.bus.read(session_id, last_id)
+            if events and events[0][0] > last_id + 1:
+                # Older lines were dropped from the bounded buffer
+                chunk.append(f"data: {json.dumps({'type': 'truncated', 'skipped': events[0][0] - last_id - 1})}\n\n")
+            for event_id, log in events:
+                if log == "__COMPLETE__":
+                    # Session completed, close (a reconnect gets this event again)
+                    self.channels.discard(session_id)
+                    chunk.append(f"id: {event_id}\ndata: {json.dumps({'type': 'complete'})}\n\n")
+                    yield "".join(chunk)
+                    return
+                chunk.append(f"id: {event_id}\ndata: {json.dumps({'type': 'log', 'message': log})}\n\n")
+                last_id = event_id
+            if chunk:
+                yield "".join(chunk)
+                continue
+
+            if not self.channels.wait(session_id, seen_version, HEARTBEAT_INTERVAL):
+                # SSE comment keeps proxies from closing an idle stream
+                yield ": heartbeat\n\n"
+
+    def get_sse_response(self, session_id: str, last_event_id: Optional[str] = None) -> Response:
+        """Get Flask Response object for SSE streaming, resuming after last_event_id"""
+        try:
+            resume_after = max(0, int(last_event_id)) if last_event_id else 0
+        except ValueError:
+            resume_after = 0
         return Response(
-            self.stream_logs(session_id),
+            self.stream_logs(session_id, resume_after),
             mimetype='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache',
@@ -112,22 +232,18 @@ class RealTimeLogger:
 
     def cleanup_session(self, session_id: str):
         """Manually cleanup a session (in case of errors)"""
-        with self.lock:
-            if session_id in self.connections:
-                del self.connections[session_id]
-            if session_id in self.results:
-                del self.results[session_id]
+        self.bus.delete_session(session_id)
+        self.bus.delete_result(session_id)
+        self.channels.notify(session_id)
 
     def get_active_sessions(self):
         """Get list of active session IDs"""
-        with self.lock:
-            return list(self.connections.keys())
+        return self.bus.list_sessions()
 
     def cleanup_all_sessions(self):
         """Clean up all active sessions (emergency cleanup)"""
-        with self.lock:
-            self.connections.clear()
-            self.results.clear()
+        self.bus.clear()
+        self.channels.notify_waiting()
 
 # Global instance
 realtime_logger = RealTimeLogger()
\ No newline at end of file
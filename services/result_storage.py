@@ -1,19 +1,92 @@
 """
 Result Storage Service - Independent of logging system
-Handles operation results separately from real-time logs
+Handles operation results separately from real-time logs, with a TTL per
+entry, a global memory budget (LRU eviction) and spill-to-disk for large
+results. Spill files left by recycled workers are swept once they are
+past the TTL.
 """
 
+import json
+import os
+import tempfile
 import threading
+import time
 import uuid
+from collections import OrderedDict
 from typing import Dict, Optional
 
+
+class _Entry:
+    """A stored result, kept in memory or spilled to a JSON file"""
+
+    __slots__ = ('result', 'path', 'size', 'expires_at')
+
+    def __init__(self, result: Optional[dict], path: Optional[str], size: int, expires_at: float):
+        self.result = result
+        self.path = path
+        self.size = size
+        self.expires_at = expires_at
+
+
 class ResultStorage:
-    def __init__(self):
-        # Store results with operation IDs
-        self.results: Dict[str, dict] = {}
+    # Seconds between two sweeps of the spill directory
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, ttl: int = 3600, max_bytes: int = 64 * 1024 * 1024,
+                 spill_bytes: int = 256 * 1024, spill_dir: Optional[str] = None):
+        """
+        Args:
+            ttl: Seconds a result is kept after being stored
+            max_bytes: Memory budget for results kept in memory
+            spill_bytes: Results larger than this are written to spill_dir
+                instead of memory (0 disables spilling)
+            spill_dir: Directory for spilled results
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.spill_bytes = spill_bytes
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), 'easyrent-results')
+        # Store results with operation IDs, least recently used first
+        self.results: "OrderedDict[str, _Entry]" = OrderedDict()
         # Track pending operations
         self.pending_operations: set = set()
+        self.memory_bytes = 0
+        self.counters: Dict[str, int] = {
+            'stored': 0, 'hits': 0, 'misses': 0, 'evictions': 0,
+            'expirations': 0, 'spilled': 0, 'disk_reads': 0, 'swept': 0
+        }
         self.lock = threading.Lock()
+        self._swept_at = 0.0
+        # Files of workers that were recycled are not in any index any more
+        self.sweep_spill_dir()
+
+    def sweep_spill_dir(self) -> int:
+        """
+        Delete spill files older than the TTL, whichever process wrote them
+
+        Returns:
+            Number of files deleted
+        """
+        self._swept_at = time.time()
+        cutoff = self._swept_at - self.ttl
+        removed = 0
+        try:
+            entries = list(os.scandir(self.spill_dir))
+        except OSError:
+            return 0
+        for entry in entries:
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                pass  # Removed by another worker meanwhile
+        if removed:
+            with self.lock:
+                self.counters['swept'] += removed
+        return removed
 
     def create_operation_id(self) -> str:
         """Create a new operation ID for result tracking"""
@@ -24,38 +97,126 @@ class ResultStorage:
 
     def store_result(self, operation_id: str, result: dict):
         """Store a result for an operation"""
+        payload = json.dumps(result, default=str)
+        size = len(payload)
+        expires_at = time.time() + self.ttl
+
+        path = None
+        if self.spill_bytes and size > self.spill_bytes:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+
         with self.lock:
-            self.results[operation_id] = result
+            self._remove(operation_id)
+            if path:
+                entry = _Entry(None, path, size, expires_at)
+                self.counters['spilled'] += 1
+            else:
+                entry = _Entry(result, None, size, expires_at)
+                self.memory_bytes += size
+            self.results[operation_id] = entry
+            self.counters['stored'] += 1
             # Remove from pending when result is stored
             self.pending_operations.discard(operation_id)
+            self._expire()
+            self._evict()
+        if time.time() - self._swept_at > self.SWEEP_INTERVAL:
+            self.sweep_spill_dir()
 
     def get_result(self, operation_id: str) -> Optional[dict]:
         """Get the result for an operation"""
         with self.lock:
-            return self.results.get(operation_id)
+            entry = self.results.get(operation_id)
+            if entry is not None and entry.expires_at <= time.time():
+                self._remove(operation_id)
+                self.counters['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            self.results.move_to_end(operation_id)
+            self.counters['hits'] += 1
+            if entry.path is None:
+                return entry.result
+            self.counters['disk_reads'] += 1
+            path = entry.path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except OSError:
+            return None
 
     def clear_result(self, operation_id: str):
         """Clear a specific result"""
         with self.lock:
-            if operation_id in self.results:
-                del self.results[operation_id]
+            self._remove(operation_id)
             self.pending_operations.discard(operation_id)
 
     def clear_all_results(self):
         """Clear all stored results"""
         with self.lock:
-            self.results.clear()
+            for operation_id in list(self.results):
+                self._remove(operation_id)
             self.pending_operations.clear()
 
     def get_operation_status(self, operation_id: str) -> str:
         """Get operation status: 'pending', 'completed', 'not_found'"""
         with self.lock:
-            if operation_id in self.results:
+            entry = self.results.get(operation_id)
+            if entry is not None and entry.expires_at > time.time():
                 return 'completed'
             elif operation_id in self.pending_operations:
                 return 'pending'
             else:
                 return 'not_found'
 
+    def stats(self) -> dict:
+        """Counters for monitoring"""
+        with self.lock:
+            spilled = sum(1 for entry in self.results.values() if entry.path)
+            return dict(self.counters,
+                        entries=len(self.results),
+                        spilled_entries=spilled,
+                        memory_bytes=self.memory_bytes,
+                        max_bytes=self.max_bytes,
+                        ttl=self.ttl)
+
+    def _remove(self, operation_id: str):
+        """Drop an entry and its spill file (lock held)"""
+        entry = self.results.pop(operation_id, None)
+        if entry is None:
+            return
+        if entry.path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        else:
+            self.memory_bytes -= entry.size
+
+    def _expire(self):
+        """Drop entries past their TTL (lock held)"""
+        now = time.time()
+        for operation_id in [oid for oid, entry in self.results.items() if entry.expires_at <= now]:
+            self._remove(operation_id)
+            self.counters['expirations'] += 1
+
+    def _evict(self):
+        """Drop least recently used in-memory entries over the budget (lock held)"""
+        if self.memory_bytes <= self.max_bytes:
+            return
+        for operation_id in [oid for oid, entry in self.results.items() if entry.path is None]:
+            self._remove(operation_id)
+            self.counters['evictions'] += 1
+            if self.memory_bytes <= self.max_bytes:
+                break
+
 # Global instance
-result_storage = ResultStorage()
\ No newline at end of file
+result_storage = ResultStorage(
+    ttl=int(os.getenv('RESULT_TTL_SECONDS', '3600')),
+    max_bytes=int(os.getenv('RESULT_MAX_MB', '64')) * 1024 * 1024,
+    spill_bytes=int(os.getenv('RESULT_SPILL_KB', '256')) * 1024,
+    spill_dir=os.getenv('RESULT_SPILL_DIR')
+)
@@ -12,9 +12,121 @@ import uuid
 import pandas as pd
 from datetime import datetime
 from collections import defaultdict
+from openpyxl.packaging.custom import StringProperty
 from .logger_service import log_tracking_operation
 from .realtime_logger import realtime_logger
+from .workbook_cache import workbook_cache
+from .excel_writer import ColumnFormats, save_workbook, write_sheet
+from .file_index import file_index
+from .preview_service import write_preview_sidecar
 
+# Only columns of the transport file used to build the tracking mapping
+TRASPORTI_COLUMNS = ["Riferimento alfanumerico", "N. sped."]
+
+# TRACKING RADAR columns shown as dates without time
+RADAR_DATE_COLUMNS = ["DATA SPEDIZIONE", "DATA CONSEGNA", "Data/ora creazione"]
+
+# Number formats of the cells written into POBS and TRACKING RADAR
+TRACKING_FORMATS = {'date': "DD/MM/YYYY", 'cap': "00000", 'imei': '0'}
+
+# Full CAP normalization of the POBS: 'once' per file (recorded by a marker),
+# 'always' on every run, or 'never' (only the rows a run updates)
+CAP_FULL_PASS = os.getenv('TRACKING_CAP_FULL_PASS', 'once').lower()
+# Custom document property of a POBS whose CAP column was fully normalized
+CAP_MARKER = 'EasyRent CAP normalized'
+
+
+def _imei_number(value):
+    """IMEI stored as a number with no decimal places"""
+    if value:
+        try:
+            return int(str(value).strip()), TRACKING_FORMATS['imei']
+        except Exception:
+            pass
+    return value, None
+
+
+def _date_only(value):
+    if isinstance(value, datetime):
+        return value.date(), TRACKING_FORMATS['date']
+    return value, None
+
+
+def _cap_number(value):
+    """CAP stored as a number shown with its leading zeros"""
+    if value:
+        try:
+            return int(value), TRACKING_FORMATS['cap']
+        except Exception:
+            pass
+    return value, None
+
+
+def normalize_cap(pobs_wb, pobs_sheet, cap_idx, rows, formats):
+    """
+    Store the CAP of the given rows as numbers shown with leading zeros
+
+    When the one-time full pass is due every row is normalized instead, and
+    the workbook is marked so later runs only touch the rows they update.
+    A POBS rewritten by another tool loses the marker and is normalized again.
+
+    Returns:
+        True if the full pass ran
+    """
+    marked = CAP_MARKER in pobs_wb.custom_doc_props.names
+    full = CAP_FULL_PASS == 'always' or (CAP_FULL_PASS == 'once' and not marked)
+    if full:
+        rows = range(2, pobs_sheet.max_row + 1)
+
+    cap_rows = []
+    for r in rows:
+        cell = pobs_sheet.cell(row=r, column=cap_idx)
+        if cell.value:
+            try:
+                cell.value = int(cell.value)
+                cap_rows.append(r)
+            except Exception:
+                pass
+    formats.format_rows(pobs_sheet, cap_idx, cap_rows, 'cap')
+
+    if full and not marked:
+        pobs_wb.custom_doc_props.append(StringProperty(name=CAP_MARKER, value=datetime.now().isoformat(timespec='seconds')))
+    return full
+
+
+def write_tracking_radar(path, radar_headers, rows):
+    """
+    Stream the TRACKING RADAR sheet: tracking numbers are cleaned and the
+    IMEI, date and CAP columns converted and formatted as rows are written
+    """
+    converters = defaultdict(list)
+    # First IMEI* column holds numbers
+    for i, header in enumerate(radar_headers):
+        if "IMEI" in header:
+            converters[i].append(_imei_number)
+            break
+    for colname in RADAR_DATE_COLUMNS:
+        if colname in radar_headers:
+            converters[radar_headers.index(colname)].append(_date_only)
+    if "CAP" in radar_headers:
+        converters[radar_headers.index("CAP")].append(_cap_number)
+
+    tracking_col_idx = radar_headers.index("TRACKING - LDV TNT") if "TRACKING - LDV TNT" in radar_headers else None
+
+    def radar_rows():
+        for row in rows:
+            row_data = list(row[:len(radar_headers)])
+            # Clean tracking value if column exists
+            if tracking_col_idx is not None:
+                tracking_val = row_data[tracking_col_idx]
+                if tracking_val:
+                    # Remove formula-like formatting
+                    row_data[tracking_col_idx] = str(tracking_val).replace('="', '').replace('"', '').strip()
+            yield row_data
+
+    return write_sheet(path, radar_headers, radar_rows(), converters, title="Tracking Radar")
+
+@workbook_cache.operation()
 def generate_upload_gsped(pobs_path, masterfile_path, output_dir):
     """
     Generate Upload Gsped file
@@ -48,16 +160,15 @@ def generate_upload_gsped(pobs_path, masterfile_path, output_dir):
 
         # Load masterfile and extract GUIDs from "PER STOPRIPARO" sheet
         processing_log.append(f"[INFO] Loading master file: {os.path.basename(masterfile_path)}")
-        master_wb = openpyxl.load_workbook(masterfile_path, data_only=True)
-        if "PER STOPRIPARO" not in master_wb.sheetnames:
+        master_rows = workbook_cache.read_sheet_values(masterfile_path, "PER STOPRIPARO", max_col=2)
+        if master_rows is None:
             processing_log.append("[ERROR] MasterFile does not contain 'PER STOPRIPARO' sheet")
             raise Exception("MasterFile does not contain 'PER STOPRIPARO' sheet.")
-        master_sheet = master_wb["PER STOPRIPARO"]
         processing_log.append("[OK] Master file loaded successfully")
 
         processing_log.append("[INFO] Extracting GUIDs from master file...")
         master_guids = set()
-        for row_idx, row in enumerate(master_sheet.iter_rows(values_only=True), start=1):
+        for row_idx, row in enumerate(master_rows, start=1):
             if row_idx == 1:  # Skip header
                 continue
             guid = row[1]  # Column B
@@ -67,9 +178,8 @@ def generate_upload_gsped(pobs_path, masterfile_path, output_dir):
 
         # Load POBS file
         processing_log.append(f"[INFO] Loading POBS file: {os.path.basename(pobs_path)}")
-        pobs_wb = openpyxl.load_workbook(pobs_path, data_only=True)
-        pobs_sheet = pobs_wb.active
-        processing_log.append(f"[OK] POBS file loaded with {pobs_sheet.max_row} rows")
+        pobs_rows = workbook_cache.read_sheet_values(pobs_path, max_col=20)
+        processing_log.append(f"[OK] POBS file loaded with {len(pobs_rows)} rows")
 
         # Load template for headers
         processing_log.append("[INFO] Loading template headers...")
@@ -124,7 +234,7 @@ def generate_upload_gsped(pobs_path, masterfile_path, output_dir):
         r_values = []
         processed_count = 0
 
-        for row_idx, row in enumerate(pobs_sheet.iter_rows(values_only=True), start=1):
+        for row_idx, row in enumerate(pobs_rows, start=1):
             if row_idx == 1:  # Skip header
                 continue
 
@@ -194,7 +304,9 @@ def generate_upload_gsped(pobs_path, masterfile_path, output_dir):
                 new_ws.write(row_out, col, value)
             row_out += 1
 
-        new_wb.save(output_path)
+        save_workbook(new_wb, output_path)
+        file_index.register(output_path)
+        write_preview_sidecar(output_path)
         processing_log.append(f"[OK] Output file saved: {output_filename}")
         processing_log.append("[OK] Upload Gsped generation completed successfully")
 
@@ -274,6 +386,7 @@ def generate_upload_gsped(pobs_path, masterfile_path, output_dir):
             'processing_log': processing_log
         }
 
+@workbook_cache.operation()
 def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir, custom_name=None):
     """
     Update tracking data in POBS and generate TRACKING RADAR with masterfile integration
@@ -290,16 +403,18 @@ def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir,
         backup_path = os.path.join(backup_dir, backup_filename)
         import shutil
         shutil.copy2(pobs_path, backup_path)
+        file_index.register(backup_path)
 
         # Load POBS file
         pobs_wb = openpyxl.load_workbook(pobs_path)
         pobs_sheet = pobs_wb.active
+        formats = ColumnFormats(pobs_wb, TRACKING_FORMATS)
 
         # Load transport file (CSV or Excel)
         if trasporti_path.lower().endswith(".csv"):
             trasporti_df = pd.read_csv(trasporti_path, dtype=str, sep=None, engine="python")
         else:
-            trasporti_df = pd.read_excel(trasporti_path, dtype=str)
+            trasporti_df = workbook_cache.read_excel(trasporti_path, columns=TRASPORTI_COLUMNS, dtype=str)
 
         trasporti_df = trasporti_df.fillna("")
 
@@ -330,10 +445,9 @@ def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir,
         # Load MasterFile for shipping dates
         master_dates = {}
         if masterfile_path:
-            master_wb = openpyxl.load_workbook(masterfile_path, data_only=True)
-            if "PER STOPRIPARO" in master_wb.sheetnames:
-                sheet = master_wb["PER STOPRIPARO"]
-                for i, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+            master_rows = workbook_cache.read_sheet_values(masterfile_path, "PER STOPRIPARO", max_col=3)
+            if master_rows is not None:
+                for i, row in enumerate(master_rows, start=1):
                     if i == 1:  # Skip header
                         continue
                     guid = str(row[1]).strip() if row[1] else None
@@ -350,6 +464,9 @@ def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir,
 
         updates = 0
         updated_rows = []
+        # Row numbers of the updated rows, the only ones whose CAP is normalized
+        dirty_rows = []
+        date_rows = []
 
         # Update POBS with tracking numbers and shipping dates
         for i, row in enumerate(pobs_sheet.iter_rows(min_row=2, values_only=False), start=2):
@@ -372,28 +489,22 @@ def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir,
                     if isinstance(date_val, datetime):
                         from datetime import date
                         only_date = date(date_val.year, date_val.month, date_val.day)
-                        cell = pobs_sheet.cell(row=i, column=data_sped_col_idx, value=only_date)
-                        cell.number_format = "DD/MM/YYYY"
+                        pobs_sheet.cell(row=i, column=data_sped_col_idx, value=only_date)
+                        date_rows.append(i)
                     changed = True
 
                 if changed:
                     updated_rows.append([cell.value for cell in row])
+                    dirty_rows.append(i)
                     updates += 1
 
+        # Shipping dates written above, formatted in one go
+        formats.format_rows(pobs_sheet, data_sped_col_idx, date_rows, 'date')
+
         # Format CAP column
         if "CAP" in headers:
-            cap_idx = headers.index("CAP") + 1
-            for r in range(2, pobs_sheet.max_row + 1):
-                cell = pobs_sheet.cell(row=r, column=cap_idx)
-                if cell.value:
-                    try:
-                        cell.value = int(cell.value)
-                        cell.number_format = "00000"
-                    except:
-                        pass
-
-        # Save modifications directly to original POBS
-        pobs_wb.save(pobs_path)
+            if normalize_cap(pobs_wb, pobs_sheet, headers.index("CAP") + 1, dirty_rows, formats):
+                processing_log.append("[INFO] CAP column fully normalized")
 
         # Also save a copy to POBS CON TRACKING folder
         pobs_tracking_dir = os.path.join(output_dir, "POBS CON TRACKING")
@@ -403,7 +514,11 @@ def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir,
         original_name = os.path.splitext(os.path.basename(pobs_path))[0]
         pobs_tracking_filename = f"{original_name}_con_tracking_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         pobs_tracking_path = os.path.join(pobs_tracking_dir, pobs_tracking_filename)
-        pobs_wb.save(pobs_tracking_path)
+
+        # Save modifications directly to original POBS, serialized once for both files
+        save_workbook(pobs_wb, pobs_path, [pobs_tracking_path])
+        file_index.register(pobs_tracking_path)
+        write_preview_sidecar(pobs_tracking_path, pobs_wb)
 
         # Generate TRACKING RADAR file
         if "DATA CONSEGNA" not in headers:
@@ -411,67 +526,6 @@ def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir,
         last_col_idx = headers.index("DATA CONSEGNA") + 1
         radar_headers = headers[:last_col_idx]
 
-        radar_wb = openpyxl.Workbook()
-        radar_ws = radar_wb.active
-        radar_ws.title = "Tracking Radar"
-        radar_ws.append(radar_headers)
-
-        # Process rows before adding to RADAR
-        tracking_col_idx_radar = radar_headers.index("TRACKING - LDV TNT") if "TRACKING - LDV TNT" in radar_headers else None
-
-        for row in updated_rows:
-            row_data = list(row[:last_col_idx])
-            # Clean tracking value if column exists
-            if tracking_col_idx_radar is not None:
-                tracking_val = row_data[tracking_col_idx_radar]
-                if tracking_val:
-                    # Remove formula-like formatting
-                    cleaned_val = str(tracking_val).replace('="', '').replace('"', '').strip()
-                    row_data[tracking_col_idx_radar] = cleaned_val
-            radar_ws.append(row_data)
-
-        # Format IMEI* column to ensure NUMBER format
-        imei_column_name = None
-        for header in radar_headers:
-            if "IMEI" in header:
-                imei_column_name = header
-                break
-
-        if imei_column_name:
-            imei_idx = radar_headers.index(imei_column_name) + 1
-            for r in range(2, radar_ws.max_row + 1):
-                cell = radar_ws.cell(row=r, column=imei_idx)
-                if cell.value:
-                    try:
-                        # Convert to integer to ensure it's stored as number
-                        cell.value = int(str(cell.value).strip())
-                        # Apply number format with no decimal places
-                        cell.number_format = '0'
-                    except:
-                        pass
-
-        for colname in ["DATA SPEDIZIONE", "DATA CONSEGNA", "Data/ora creazione"]:
-            if colname in radar_headers:
-                col_idx = radar_headers.index(colname) + 1
-                for r in range(2, radar_ws.max_row + 1):
-                    cell = radar_ws.cell(row=r, column=col_idx)
-                    if isinstance(cell.value, datetime):
-                        from datetime import date
-                        only_date = date(cell.value.year, cell.value.month, cell.value.day)
-                        cell.value = only_date
-                        cell.number_format = "DD/MM/YYYY"
-
-        if "CAP" in radar_headers:
-            cap_idx = radar_headers.index("CAP") + 1
-            for r in range(2, radar_ws.max_row + 1):
-                cell = radar_ws.cell(row=r, column=cap_idx)
-                if cell.value:
-                    try:
-                        cell.value = int(cell.value)
-                        cell.number_format = "00000"
-                    except:
-                        pass
-
         # Create TRACKING RADAR folder
         radar_dir = os.path.join(output_dir, "TRACKING RADAR")
         os.makedirs(radar_dir, exist_ok=True)
@@ -483,7 +537,10 @@ def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir,
             radar_filename = f"TRACKING RADAR_{datetime.now().strftime('%Y%m%d')}.xlsx"
 
         radar_output_path = os.path.join(radar_dir, radar_filename)
-        radar_wb.save(radar_output_path)
+        # Rows are converted and formatted while they are streamed to the file
+        write_tracking_radar(radar_output_path, radar_headers, updated_rows)
+        file_index.register(radar_output_path)
+        write_preview_sidecar(radar_output_path)
 
         # Create structured log using new logging system
         log_details = {
@@ -555,6 +612,7 @@ def update_tracking_data(pobs_path, trasporti_path, masterfile_path, output_dir,
             'log_file': log_filename
         }
 
+@workbook_cache.operation()
 def generate_upload_gsped_realtime(pobs_path, masterfile_path, output_dir, session_id=None):
     """
     Real-time version of generate_upload_gsped with live logging
@@ -588,16 +646,15 @@ def generate_upload_gsped_realtime(pobs_path, masterfile_path, output_dir, sessi
 
         # Load masterfile and extract GUIDs from "PER STOPRIPARO" sheet
         realtime_logger.log(session_id, f"Loading master file: {os.path.basename(masterfile_path)}", "info")
-        master_wb = openpyxl.load_workbook(masterfile_path, data_only=True)
-        if "PER STOPRIPARO" not in master_wb.sheetnames:
+        master_rows = workbook_cache.read_sheet_values(masterfile_path, "PER STOPRIPARO", max_col=2)
+        if master_rows is None:
             realtime_logger.log(session_id, "MasterFile does not contain 'PER STOPRIPARO' sheet", "error")
             raise Exception("MasterFile does not contain 'PER STOPRIPARO' sheet.")
-        master_sheet = master_wb["PER STOPRIPARO"]
         realtime_logger.log(session_id, "Master file loaded successfully", "success")
 
         realtime_logger.log(session_id, "Extracting GUIDs from master file...", "info")
         master_guids = set()
-        for row_idx, row in enumerate(master_sheet.iter_rows(values_only=True), start=1):
+        for row_idx, row in enumerate(master_rows, start=1):
             if row_idx == 1:  # Skip header
                 continue
             guid = row[1]  # Column B
@@ -607,9 +664,8 @@ def generate_upload_gsped_realtime(pobs_path, masterfile_path, output_dir, sessi
 
         # Load POBS file
         realtime_logger.log(session_id, f"Loading POBS file: {os.path.basename(pobs_path)}", "info")
-        pobs_wb = openpyxl.load_workbook(pobs_path, data_only=True)
-        pobs_sheet = pobs_wb.active
-        realtime_logger.log(session_id, f"POBS file loaded with {pobs_sheet.max_row} rows", "success")
+        pobs_rows = workbook_cache.read_sheet_values(pobs_path, max_col=20)
+        realtime_logger.log(session_id, f"POBS file loaded with {len(pobs_rows)} rows", "success")
 
         # Load template for headers
         realtime_logger.log(session_id, "Loading template headers...", "info")
@@ -664,7 +720,7 @@ def generate_upload_gsped_realtime(pobs_path, masterfile_path, output_dir, sessi
         r_values = []
         processed_count = 0
 
-        for row_idx, row in enumerate(pobs_sheet.iter_rows(values_only=True), start=1):
+        for row_idx, row in enumerate(pobs_rows, start=1):
             if row_idx == 1:  # Skip header
                 continue
 
@@ -734,7 +790,9 @@ def generate_upload_gsped_realtime(pobs_path, masterfile_path, output_dir, sessi
                 new_ws.write(row_out, col, value)
             row_out += 1
 
-        new_wb.save(output_path)
+        save_workbook(new_wb, output_path)
+        file_index.register(output_path)
+        write_preview_sidecar(output_path)
         realtime_logger.log(session_id, f"Output file saved: {output_filename}", "success")
         realtime_logger.log(session_id, "Upload Gsped generation completed successfully", "success")
 
@@ -811,6 +869,7 @@ def generate_upload_gsped_realtime(pobs_path, masterfile_path, output_dir, sessi
 
         return result
 
+@workbook_cache.operation()
 def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, output_dir, custom_name=None, session_id=None):
     """
     Real-time version of update_tracking_data with live logging
@@ -829,12 +888,14 @@ def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, ou
         backup_path = os.path.join(backup_dir, backup_filename)
         import shutil
         shutil.copy2(pobs_path, backup_path)
+        file_index.register(backup_path)
         realtime_logger.log(session_id, f"Backup created: {backup_filename}", "success")
 
         # Load POBS file
         realtime_logger.log(session_id, f"Loading POBS file: {os.path.basename(pobs_path)}", "info")
         pobs_wb = openpyxl.load_workbook(pobs_path)
         pobs_sheet = pobs_wb.active
+        formats = ColumnFormats(pobs_wb, TRACKING_FORMATS)
         realtime_logger.log(session_id, "POBS file loaded successfully", "success")
 
         # Load transport file (CSV or Excel)
@@ -842,7 +903,7 @@ def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, ou
         if trasporti_path.lower().endswith(".csv"):
             trasporti_df = pd.read_csv(trasporti_path, dtype=str, sep=None, engine="python")
         else:
-            trasporti_df = pd.read_excel(trasporti_path, dtype=str)
+            trasporti_df = workbook_cache.read_excel(trasporti_path, columns=TRASPORTI_COLUMNS, dtype=str)
 
         trasporti_df = trasporti_df.fillna("")
         realtime_logger.log(session_id, f"Transport file loaded with {len(trasporti_df)} rows", "success")
@@ -879,10 +940,9 @@ def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, ou
         master_dates = {}
         if masterfile_path:
             realtime_logger.log(session_id, f"Loading master file for shipping dates: {os.path.basename(masterfile_path)}", "info")
-            master_wb = openpyxl.load_workbook(masterfile_path, data_only=True)
-            if "PER STOPRIPARO" in master_wb.sheetnames:
-                sheet = master_wb["PER STOPRIPARO"]
-                for i, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+            master_rows = workbook_cache.read_sheet_values(masterfile_path, "PER STOPRIPARO", max_col=3)
+            if master_rows is not None:
+                for i, row in enumerate(master_rows, start=1):
                     if i == 1:  # Skip header
                         continue
                     guid = str(row[1]).strip() if row[1] else None
@@ -903,6 +963,9 @@ def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, ou
 
         updates = 0
         updated_rows = []
+        # Row numbers of the updated rows, the only ones whose CAP is normalized
+        dirty_rows = []
+        date_rows = []
 
         # Update POBS with tracking numbers and shipping dates
         realtime_logger.log(session_id, "Updating POBS with tracking numbers and shipping dates...", "info")
@@ -931,32 +994,25 @@ def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, ou
                     if isinstance(date_val, datetime):
                         from datetime import date
                         only_date = date(date_val.year, date_val.month, date_val.day)
-                        cell = pobs_sheet.cell(row=i, column=data_sped_col_idx, value=only_date)
-                        cell.number_format = "DD/MM/YYYY"
+                        pobs_sheet.cell(row=i, column=data_sped_col_idx, value=only_date)
+                        date_rows.append(i)
                     changed = True
 
                 if changed:
                     updated_rows.append([cell.value for cell in row])
+                    dirty_rows.append(i)
                     updates += 1
 
         realtime_logger.log(session_id, f"Updated {updates} records in POBS", "success")
 
+        # Shipping dates written above, formatted in one go
+        formats.format_rows(pobs_sheet, data_sped_col_idx, date_rows, 'date')
+
         # Format CAP column
         realtime_logger.log(session_id, "Formatting CAP column...", "info")
         if "CAP" in headers:
-            cap_idx = headers.index("CAP") + 1
-            for r in range(2, pobs_sheet.max_row + 1):
-                cell = pobs_sheet.cell(row=r, column=cap_idx)
-                if cell.value:
-                    try:
-                        cell.value = int(cell.value)
-                        cell.number_format = "00000"
-                    except:
-                        pass
-
-        # Save modifications directly to original POBS
-        realtime_logger.log(session_id, "Saving updated POBS file...", "info")
-        pobs_wb.save(pobs_path)
+            if normalize_cap(pobs_wb, pobs_sheet, headers.index("CAP") + 1, dirty_rows, formats):
+                realtime_logger.log(session_id, "CAP column fully normalized", "info")
 
         # Also save a copy to POBS CON TRACKING folder
         pobs_tracking_dir = os.path.join(output_dir, "POBS CON TRACKING")
@@ -966,7 +1022,12 @@ def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, ou
         original_name = os.path.splitext(os.path.basename(pobs_path))[0]
         pobs_tracking_filename = f"{original_name}_con_tracking_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         pobs_tracking_path = os.path.join(pobs_tracking_dir, pobs_tracking_filename)
-        pobs_wb.save(pobs_tracking_path)
+
+        # Save modifications directly to original POBS, serialized once for both files
+        realtime_logger.log(session_id, "Saving updated POBS file...", "info")
+        save_workbook(pobs_wb, pobs_path, [pobs_tracking_path])
+        file_index.register(pobs_tracking_path)
+        write_preview_sidecar(pobs_tracking_path, pobs_wb)
         realtime_logger.log(session_id, f"POBS with tracking saved: {pobs_tracking_filename}", "success")
 
         # Generate TRACKING RADAR file
@@ -977,67 +1038,6 @@ def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, ou
         last_col_idx = headers.index("DATA CONSEGNA") + 1
         radar_headers = headers[:last_col_idx]
 
-        radar_wb = openpyxl.Workbook()
-        radar_ws = radar_wb.active
-        radar_ws.title = "Tracking Radar"
-        radar_ws.append(radar_headers)
-
-        # Process rows before adding to RADAR
-        tracking_col_idx_radar = radar_headers.index("TRACKING - LDV TNT") if "TRACKING - LDV TNT" in radar_headers else None
-
-        for row in updated_rows:
-            row_data = list(row[:last_col_idx])
-            # Clean tracking value if column exists
-            if tracking_col_idx_radar is not None:
-                tracking_val = row_data[tracking_col_idx_radar]
-                if tracking_val:
-                    # Remove formula-like formatting
-                    cleaned_val = str(tracking_val).replace('="', '').replace('"', '').strip()
-                    row_data[tracking_col_idx_radar] = cleaned_val
-            radar_ws.append(row_data)
-
-        # Format IMEI* column to ensure NUMBER format
-        imei_column_name = None
-        for header in radar_headers:
-            if "IMEI" in header:
-                imei_column_name = header
-                break
-
-        if imei_column_name:
-            imei_idx = radar_headers.index(imei_column_name) + 1
-            for r in range(2, radar_ws.max_row + 1):
-                cell = radar_ws.cell(row=r, column=imei_idx)
-                if cell.value:
-                    try:
-                        # Convert to integer to ensure it's stored as number
-                        cell.value = int(str(cell.value).strip())
-                        # Apply number format with no decimal places
-                        cell.number_format = '0'
-                    except:
-                        pass
-
-        for colname in ["DATA SPEDIZIONE", "DATA CONSEGNA", "Data/ora creazione"]:
-            if colname in radar_headers:
-                col_idx = radar_headers.index(colname) + 1
-                for r in range(2, radar_ws.max_row + 1):
-                    cell = radar_ws.cell(row=r, column=col_idx)
-                    if isinstance(cell.value, datetime):
-                        from datetime import date
-                        only_date = date(cell.value.year, cell.value.month, cell.value.day)
-                        cell.value = only_date
-                        cell.number_format = "DD/MM/YYYY"
-
-        if "CAP" in radar_headers:
-            cap_idx = radar_headers.index("CAP") + 1
-            for r in range(2, radar_ws.max_row + 1):
-                cell = radar_ws.cell(row=r, column=cap_idx)
-                if cell.value:
-                    try:
-                        cell.value = int(cell.value)
-                        cell.number_format = "00000"
-                    except:
-                        pass
-
         # Create TRACKING RADAR folder
         radar_dir = os.path.join(output_dir, "TRACKING RADAR")
         os.makedirs(radar_dir, exist_ok=True)
@@ -1049,7 +1049,10 @@ def update_tracking_data_realtime(pobs_path, trasporti_path, masterfile_path, ou
             radar_filename = f"TRACKING RADAR_{datetime.now().strftime('%Y%m%d')}.xlsx"
 
         radar_output_path = os.path.join(radar_dir, radar_filename)
-        radar_wb.save(radar_output_path)
+        # Rows are converted and formatted while they are streamed to the file
+        write_tracking_radar(radar_output_path, radar_headers, updated_rows)
+        file_index.register(radar_output_path)
+        write_preview_sidecar(radar_output_path)
         realtime_logger.log(session_id, f"TRACKING RADAR saved: {radar_filename}", "success")
 
         # Create structured log using new logging system
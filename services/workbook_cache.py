@@ -0,0 +1,278 @@
+"""
+Workbook Cache Service
+Parse-once cache for Excel inputs shared across a single operation,
+backed by a content-addressed LRU cache shared across requests
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from . import excel_io
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file's content"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _freeze(value):
+    """Turn read options into something hashable for use in cache keys"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, type):
+        return value.__name__
+    return value
+
+
+def estimate_size(value) -> int:
+    """Approximate memory footprint of a parsed input in bytes"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, list):
+        if not value:
+            return sys.getsizeof(value)
+        # Sample rows instead of walking every cell of large sheets
+        step = max(1, len(value) // 200)
+        sample = value[::step]
+        per_row = sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row) for row in sample) / len(sample)
+        return int(sys.getsizeof(value) + per_row * len(value))
+    return sys.getsizeof(value)
+
+
+class ParsedInputCache:
+    """Content-addressed LRU cache of parsed inputs shared across requests"""
+
+    def __init__(self, max_entries: int = 32, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # (kind, digest, options) -> (value, size)
+        self.entries: "OrderedDict[tuple, Tuple[object, int]]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple):
+        """Return a cached value or None, refreshing its LRU position"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, value):
+        """Store a value, evicting least recently used entries over the limits"""
+        size = estimate_size(value)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached inputs"""
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        """Counters for monitoring"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class OperationCache:
+    """Parsed inputs of a single operation, keyed by file path and content hash"""
+
+    def __init__(self, owner: "WorkbookCache"):
+        self.owner = owner
+        self.entries: Dict[tuple, object] = {}
+        self.hits = 0
+        self.misses = 0
+        # file name -> reader engine that decoded it
+        self.engines: Dict[str, str] = {}
+
+    def get(self, kind: str, path: str, options: dict, loader: Callable[[], object]):
+        """Return a cached parse result, running the loader on first use"""
+        key = (kind, os.path.abspath(path), self.owner.digest(path), _freeze(options))
+        if key in self.entries:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.entries[key] = self.owner.load_shared(kind, path, options, loader)
+        return self.entries[key]
+
+    def record_engine(self, path: str, engine: str):
+        """Remember which reader engine served a file for the operation log"""
+        self.engines.setdefault(os.path.basename(path), engine)
+
+
+class WorkbookCache:
+    """Request-scoped cache so each input file is decoded at most once per operation"""
+
+    def __init__(self, shared: Optional[ParsedInputCache] = None, max_digests: int = 4096):
+        self._local = threading.local()
+        self.shared = shared or ParsedInputCache()
+        # abs path -> (size, mtime_ns, digest), least recently used first
+        self.max_digests = max_digests
+        self._digests: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._digest_lock = threading.Lock()
+
+    def _store_digest(self, abs_path: str, stat: os.stat_result, digest: str):
+        with self._digest_lock:
+            self._digests[abs_path] = (stat.st_size, stat.st_mtime_ns, digest)
+            self._digests.move_to_end(abs_path)
+            while len(self._digests) > self.max_digests:
+                self._digests.popitem(last=False)
+
+    def register_digest(self, path: str, digest: str):
+        """Record the hash of a file computed while it was being written"""
+        abs_path = os.path.abspath(path)
+        self._store_digest(abs_path, os.stat(abs_path), digest)
+
+    def digest(self, path: str) -> str:
+        """SHA-256 of a file, recomputed only when size or mtime changed"""
+        abs_path = os.path.abspath(path)
+        stat = os.stat(abs_path)
+        with self._digest_lock:
+            known = self._digests.get(abs_path)
+            if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+                self._digests.move_to_end(abs_path)
+                return known[2]
+        digest = file_digest(abs_path)
+        self._store_digest(abs_path, stat, digest)
+        return digest
+
+    def load_shared(self, kind: str, path: str, options: dict, loader: Callable[[], object]):
+        """Look up identical bytes in the cross-request cache before decoding"""
+        key = (kind, self.digest(path), _freeze(options))
+        value = self.shared.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.shared.put(key, value)
+        return value
+
+    def current(self) -> Optional[OperationCache]:
+        """Get the cache of the operation running on this thread, if any"""
+        return getattr(self._local, 'cache', None)
+
+    @contextmanager
+    def operation(self):
+        """
+        Open a parse-once scope for the current operation
+
+        Nested scopes (e.g. add_new_records calling verify_new_records) share
+        the outermost cache; parsed data is dropped when that scope exits.
+        Also usable as a decorator on service functions.
+        """
+        existing = self.current()
+        if existing is not None:
+            yield existing
+            return
+
+        cache = OperationCache(self)
+        self._local.cache = cache
+        try:
+            yield cache
+        finally:
+            self._local.cache = None
+
+    def read_excel(self, path: str, columns: Optional[list] = None, **kwargs) -> pd.DataFrame:
+        """
+        pd.read_excel through the operation cache
+
+        columns declares the only columns the operation needs (see
+        excel_io.read_frame); everything else is skipped at decode time.
+        Returns a fresh copy on every call because callers normalise
+        columns in place.
+        """
+        cache = self.current()
+        options = dict(kwargs)
+        if columns is None:
+            loader = lambda: excel_io.read_excel(path, **kwargs)
+        else:
+            loader = lambda: excel_io.read_frame(path, columns=columns, **kwargs)
+            options['columns'] = columns
+        if cache is None:
+            df = self.load_shared('frame', path, options, loader)
+        else:
+            df = cache.get('frame', path, options, loader)
+            cache.record_engine(path, excel_io.reader_engine(df))
+        return df.copy()
+
+    def read_sheet_names(self, path: str) -> List[str]:
+        """Sheet names of a workbook (only the workbook manifest is parsed)"""
+        cache = self.current()
+        loader = lambda: excel_io.read_sheet_names(path)
+        if cache is None:
+            return self.load_shared('sheetnames', path, {}, loader)
+        return cache.get('sheetnames', path, {}, loader)
+
+    def read_sheet_values(self, path: str, sheet_name: Optional[str] = None, max_col: Optional[int] = None) -> Optional[List[tuple]]:
+        """
+        Cell values of one sheet as a list of row tuples, streamed read-only
+
+        sheet_name=None reads the active sheet, max_col limits decoding to the
+        leading columns an operation needs. Returns None when the sheet does
+        not exist. The returned list is shared: do not modify it.
+        """
+        cache = self.current()
+        options = {'sheet_name': sheet_name, 'max_col': max_col}
+        loader = lambda: excel_io.read_sheet_rows(path, sheet_name, max_col)
+        if cache is None:
+            return self.load_shared('values', path, options, loader)
+        cache.record_engine(path, 'openpyxl (read-only)')
+        return cache.get('values', path, options, loader)
+
+    def reader_engines(self) -> Dict[str, str]:
+        """Reader engine of each file decoded by the current operation"""
+        cache = self.current()
+        return dict(cache.engines) if cache is not None else {}
+
+    def stats(self) -> dict:
+        """Counters of the cross-request cache"""
+        return self.shared.stats()
+
+
+# Global instance
+workbook_cache = WorkbookCache(ParsedInputCache(
+    max_entries=int(os.getenv('PARSE_CACHE_MAX_ENTRIES', '32')),
+    max_bytes=int(os.getenv('PARSE_CACHE_MAX_MB', '256')) * 1024 * 1024
+), max_digests=int(os.getenv('DIGEST_CACHE_MAX_ENTRIES', '4096')))
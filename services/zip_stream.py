@@ -0,0 +1,68 @@
+"""
+ZIP Stream Service
+Builds a ZIP archive on the fly while it is being sent, without temp files
+or holding the archive in memory
+"""
+
+import io
+import os
+import time
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target collecting what zipfile writes until drained"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_zip(files: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    Yield a ZIP of (path, name in archive) pairs chunk by chunk
+
+    Entries are stored, not deflated: the outputs are xlsx files, which are
+    already ZIP-compressed. Because the sink cannot seek, zipfile writes
+    sizes and CRCs in data descriptors after each entry; memory use stays
+    at about one CHUNK_SIZE whatever the archive size.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for path, arcname in files:
+            stat = os.stat(path)
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime(stat.st_mtime)[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            # Lets zipfile pick zip64 headers up front for huge files
+            info.file_size = stat.st_size
+            with open(path, 'rb') as source, archive.open(info, 'w') as entry:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    entry.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory, written when the archive is closed
+    data = sink.drain()
+    if data:
+        yield data